@@ -0,0 +1,94 @@
+"""
+Serialization micro-benchmark: helpers.http.dumps against the stdlib encoder for a
+product page, a large characteristics document and a batch of products with
+characteristics, stored documents passed through as RawJSON.
+
+Run from the backend directory: python -m benchmarks.serialization [--number N]
+"""
+import argparse
+import json
+import timeit
+
+from helpers.http import RawJSON, dumps, orjson
+
+
+def make_page(size: int = 20) -> dict:
+    return {
+        "data": {
+            "total": 12345,
+            "pages": 618,
+            "current": 1,
+            "next_cursor": "eyJzb3J0IjoicmVsZXZhbmNlIiwia2V5IjpbXX0=",
+            "data": [
+                {
+                    "id": f"001002003{i:06d}",
+                    "name": f"Смартфон Example Phone {i} 128 ГБ черный",
+                    "image": f"images/001002003{i:06d}.jpg",
+                    "rating": 4.5 + i % 5 / 10,
+                    "price": 99990.0 + i * 1000
+                }
+                for i in range(size)
+            ]
+        }
+    }
+
+
+def make_characteristics(groups: int = 40, features: int = 25) -> str:
+    return json.dumps([
+        {
+            "name": f"Группа {g}",
+            "features": [
+                {
+                    "code": f"feature_{g}_{f}",
+                    "name": f"Характеристика {g}.{f}",
+                    "featureValues": [{"value": f"значение {g * features + f}"}, {"value": "да"}]
+                }
+                for f in range(features)
+            ]
+        }
+        for g in range(groups)
+    ], ensure_ascii=False)
+
+
+def stdlib_dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def measure(name: str, func, number: int):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<48} {best * 1e6:>10.1f} us")
+
+
+def main():
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--number", type=int, default=200)
+    number = arguments.parse_args().number
+
+    page = make_page()
+    characteristics = make_characteristics()
+    batch_ids = [row["id"] for row in page["data"]["data"]]
+
+    print(f"orjson: {orjson.__version__ if orjson else 'not installed'}, "
+          f"characteristics: {len(characteristics.encode()) // 1024} KiB")
+
+    measure("page, stdlib json", lambda: stdlib_dumps(page), number)
+    measure("page, dumps", lambda: dumps(page), number)
+
+    measure("characteristics, loads + stdlib json", lambda: stdlib_dumps({"data": json.loads(characteristics)}), number)
+    measure("characteristics, loads + dumps", lambda: dumps({"data": json.loads(characteristics)}), number)
+    measure("characteristics, RawJSON pass-through", lambda: dumps({"data": RawJSON(characteristics)}), number)
+
+    measure(
+        "batch of 20, loads + stdlib json",
+        lambda: stdlib_dumps({"data": {id: {"characteristics": json.loads(characteristics)} for id in batch_ids}}),
+        number // 10 or 1
+    )
+    measure(
+        "batch of 20, nested RawJSON",
+        lambda: dumps({"data": {id: {"characteristics": RawJSON(characteristics)} for id in batch_ids}}),
+        number // 10 or 1
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,85 @@
+import asyncio
+import base64
+import datetime
+import functools
 import json
 import traceback
 from logging import Logger
 
 from aiohttp.web_request import Request
 
-from helpers import Database
+from helpers import Database, RawJSON, ResponseCache
+
+
+def cached(func):
+    @functools.wraps(func)
+    async def wrapper(self, request: Request):
+        key = self._cache.make_key(name=func.__name__, query=request.query)
+        return await self._cache.get_or_load(key=key, loader=lambda: func(self, request))
+
+    return wrapper
 
 
 class MarketAnalysisController:
-    def __init__(self, config: dict, logger: Logger, db: Database):
+    BATCH_LIMIT = 100
+    SUGGEST_MIN_LENGTH = 3
+    BATCH_INCLUDES = ("product", "suppliers", "characteristics")
+    FILTERS = {
+        "sort": [
+            {
+                "id": "relevance",
+                "name": "Новинки"
+            },
+            {
+                "id": "rating",
+                "name": "Высокий рейтинг"
+            },
+            {
+                "id": "cheap",
+                "name": "Сначала дешевые"
+            },
+            {
+                "id": "expensive",
+                "name": "Сначала дорогие"
+            }
+        ],
+        "price": [
+            {
+                "id": "10",
+                "name": "до 10 000 т"
+            },
+            {
+                "id": "10to50",
+                "name": "10 000 - 49 999 т"
+            },
+            {
+                "id": "50to100",
+                "name": "50 000 - 99 999 т"
+            },
+            {
+                "id": "100to150",
+                "name": "100 000 - 149 999 т"
+            },
+            {
+                "id": "150to200",
+                "name": "150 000 - 199 999 т"
+            },
+            {
+                "id": "200to500",
+                "name": "200 000 - 499 999 т"
+            },
+            {
+                "id": "more500",
+                "name": "более 500 000 т"
+            }
+        ]
+    }
+
+    def __init__(self, config: dict, logger: Logger, db: Database, cache: ResponseCache):
         self._config = config
         self._logger = logger
         self._db = db
+        self._cache = cache
 
     @staticmethod
     def response(data) -> dict:
@@ -21,6 +89,27 @@ class MarketAnalysisController:
     def error(errors) -> dict:
         return {"errors": errors}
 
+    @staticmethod
+    def encode_cursor(sort: str, key: list) -> str:
+        key = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in key]
+        payload = json.dumps({"sort": sort, "key": key}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort: str) -> list | None:
+        if not cursor:
+            return None
+
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if payload["sort"] != sort:
+            raise Exception("Cursor does not match sort filter")
+
+        key = payload["key"]
+        if sort == "relevance":
+            key[0] = datetime.datetime.fromisoformat(key[0])
+        return key
+
+    @cached
     async def get_product(self, request: Request):
         try:
             id = request.query.get("id")
@@ -37,24 +126,45 @@ class MarketAnalysisController:
         except Exception as e:
             self._logger.error(f"{e} {traceback.format_exc()}")
 
+    @cached
     async def get_products(self, request: Request):
         try:
-            page = int(request.query.get("page"))
+            page = int(request.query.get("page", 1))
             sort = request.query.get("sort")
             price = request.query.get("price")
             category_id = request.query.get("category_id")
+            facets = self.decode_facets(request.query.get("facets"))
+            cursor = request.query.get("cursor")
+            after = self.decode_cursor(cursor, sort=sort or "relevance")
 
             limit = 20
-            offset = (page - 1) * limit
-            total = await self._db.get_products_count(sort=sort, price=price, category_id=category_id)
+            offset = (page - 1) * limit if cursor is None else 0
+            products = await self._db.get_products(
+                offset=offset, limit=limit, after=after, sort=sort, price=price, category_id=category_id, facets=facets
+            )
+
+            if products and after is None:
+                total = products[0]["total"]
+                self._db.set_products_count(total=total, price=price, category_id=category_id, facets=facets)
+            else:
+                total = await self._db.get_products_count(
+                    approximate=self._config.get("count", {}).get("approximate", False),
+                    price=price,
+                    category_id=category_id,
+                    facets=facets
+                )
             pages = int(total // limit + (1 if total % limit > 0 else 0))
 
-            products = await self._db.get_products(offset=offset, limit=limit, sort=sort, price=price, category_id=category_id)
+            next_cursor = None
+            if cursor is not None and len(products) == limit:
+                next_cursor = self.encode_cursor(sort=sort or "relevance", key=[products[-1]["sort_key"], products[-1]["id"]])
 
             return self.response(data={
                 "total": total,
                 "pages": pages,
                 "current": page,
+                "next_cursor": next_cursor,
+                "facets": await self.get_facets(category_id=category_id) if category_id and cursor is None else None,
                 "data": [
                     {
                         "id": row[0],
@@ -69,22 +179,122 @@ class MarketAnalysisController:
         except Exception as e:
             self._logger.error(f"{e} {traceback.format_exc()}")
 
+    def decode_facets(self, value: str) -> dict | None:
+        """
+        facets is a JSON object of feature code -> list of accepted values.
+        """
+        if not value:
+            return None
+
+        facets = json.loads(value)
+        if not isinstance(facets, dict):
+            raise Exception("facets must be an object of feature code to values")
+
+        limit = self._config.get("facets", {}).get("max_filters", 20)
+        facets = {
+            str(code): [str(item) for item in (values if isinstance(values, list) else [values])][:limit]
+            for code, values in list(facets.items())[:limit]
+        }
+        return {code: values for code, values in facets.items() if values} or None
+
+    async def get_facets(self, category_id: str) -> list:
+        """
+        Facet value counts of the category precomputed by the parser after each crawl,
+        they do not narrow down with the active filters.
+        """
+        max_values = self._config.get("facets", {}).get("max_values", 50)
+        facets = dict()
+        for row in await self._db.get_category_facets(category_id=category_id):
+            facet = facets.setdefault(row[0], {"code": row[0], "name": row[1], "values": []})
+            if len(facet["values"]) < max_values:
+                facet["values"].append({"value": row[2], "count": row[3]})
+
+        return list(facets.values())
+
+    @cached
+    async def get_products_batch(self, request: Request):
+        try:
+            ids = list(dict.fromkeys(id for id in request.query.get("ids", "").split(",") if id))
+            if len(ids) > self.BATCH_LIMIT:
+                raise Exception(f"Too many ids, limit is {self.BATCH_LIMIT}")
+
+            include = request.query.get("include")
+            include = list(dict.fromkeys(i for i in include.split(",") if i)) if include else list(self.BATCH_INCLUDES)
+            for item in include:
+                if item not in self.BATCH_INCLUDES:
+                    raise Exception(f"Incorrect include {item}")
+
+            result = {id: {} for id in ids}
+            if not ids:
+                return self.response(data=result)
+
+            loaders = {
+                "product": lambda: self._db.get_products_by_ids(ids=ids),
+                "suppliers": lambda: self._db.get_suppliers_by_product_ids(product_ids=ids),
+                "characteristics": lambda: self._db.get_characteristics_by_ids(product_ids=ids)
+            }
+            rows = dict(zip(include, await asyncio.gather(*(loaders[item]() for item in include))))
+
+            for row in rows.get("product", []):
+                result[row[0]]["product"] = {
+                    "id": row[0],
+                    "name": row[1],
+                    "image": row[2],
+                    "rating": row[3],
+                    "price": row[4],
+                    "description": row[5]
+                }
+
+            if "suppliers" in rows:
+                for id in ids:
+                    result[id]["suppliers"] = []
+                for row in rows["suppliers"]:
+                    result[row[4]]["suppliers"].append({
+                        "id": row[0],
+                        "name": row[1],
+                        "price": row[2],
+                        "rating": row[3],
+                        "city_id": row[5]
+                    })
+
+            for row in rows.get("characteristics", []):
+                result[row[0]]["characteristics"] = RawJSON(row[1]) if row[1] else {}
+
+            return self.response(data=result)
+        except Exception as e:
+            self._logger.error(f"{e} {traceback.format_exc()}")
+
     async def search_products(self, request: Request):
         try:
-            page = int(request.query.get("page"))
-            name = request.query.get("name")
+            page = int(request.query.get("page", 1))
+            name = (request.query.get("name") or "").strip()
+            if not name:
+                # an empty query would rank and count every listed product
+                return self.response(data={"total": 0, "pages": 0, "current": page, "next_cursor": None, "data": []})
+
+            cursor = request.query.get("cursor")
+            after = self.decode_cursor(cursor, sort="search")
 
             limit = 20
-            offset = (page - 1) * limit
-            total = await self._db.get_search_products_count(query=name)
+            offset = (page - 1) * limit if cursor is None else 0
+            products = await self._db.search_products(query=name, offset=offset, limit=limit, after=after)
+
+            if products and after is None:
+                total = products[0]["total"]
+            else:
+                total = await self._db.get_search_products_count(query=name)
             pages = int(total // limit + (1 if total % limit > 0 else 0))
 
-            products = await self._db.search_products(query=name, offset=offset, limit=limit)
+            next_cursor = None
+            if cursor is not None and len(products) == limit:
+                last = products[-1]
+                next_cursor = self.encode_cursor(sort="search", key=[last["rank"], last["rating"], last["id"]])
 
             return self.response(data={
                 "total": total,
                 "pages": pages,
                 "current": page,
+                "next_cursor": next_cursor,
                 "data": [
                     {
                         "id": row[0],
@@ -99,30 +309,112 @@ class MarketAnalysisController:
         except Exception as e:
             self._logger.error(f"{e} {traceback.format_exc()}")
 
+    async def suggest_products(self, request: Request):
+        try:
+            name = (request.query.get("name") or "").strip()
+            # shorter prefixes get no help from the trigram index and are sent on every keystroke
+            if len(name) < self.SUGGEST_MIN_LENGTH:
+                return self.response(data=[])
+
+            rows = await self._db.suggest_products(prefix=name, limit=10)
+            return self.response(data=[
+                {
+                    "id": row[0],
+                    "name": row[1]
+                }
+                for row in rows
+            ])
+        except Exception as e:
+            self._logger.error(f"{e} {traceback.format_exc()}")
+
+    @cached
     async def get_suppliers(self, request: Request):
         try:
             product_id = request.query.get("product_id")
-            suppliers = await self._db.get_suppliers(product_id=product_id)
+            city_id = request.query.get("city_id") or None
+            suppliers = await self._db.get_suppliers(product_id=product_id, city_id=city_id)
             return self.response(data=[
                 {
                     "id": row[0],
                     "name": row[1],
                     "price": row[2],
-                    "rating": row[3]
+                    "rating": row[3],
+                    "city_id": row[4]
                 }
                 for row in suppliers
             ])
         except Exception as e:
             self._logger.error(f"{e} {traceback.format_exc()}")
 
+    @cached
+    async def get_product_prices(self, request: Request):
+        try:
+            product_id = request.query.get("product_id")
+            if not product_id:
+                raise Exception("product_id is required")
+
+            return self.response(data=await self.get_price_series(request=request, product_id=product_id))
+        except Exception as e:
+            self._logger.error(f"{e} {traceback.format_exc()}")
+
+    @cached
+    async def get_category_prices(self, request: Request):
+        try:
+            category_id = request.query.get("category_id")
+            if not category_id:
+                raise Exception("category_id is required")
+
+            return self.response(data=await self.get_price_series(request=request, category_id=category_id))
+        except Exception as e:
+            self._logger.error(f"{e} {traceback.format_exc()}")
+
+    async def get_price_series(self, request: Request, **kwargs) -> dict:
+        """
+        Downsamples the window to at most points buckets. The summary is computed from the
+        buckets, avg weighted by how long each price was held, so one query serves both.
+        """
+        config = self._config.get("price_history", {})
+        days = min(max(int(request.query.get("days") or config.get("default_days", 30)), 1), config.get("max_days", 365))
+        points = min(max(int(request.query.get("points") or config.get("default_points", 100)), 1), config.get("max_points", 500))
+        window = datetime.timedelta(days=days)
+
+        rows = await self._db.get_price_series(
+            window=window,
+            bucket=window / points,
+            city_id=request.query.get("city_id") or None,
+            **kwargs
+        )
+        series = [
+            {
+                "time": row[0].isoformat(),
+                "min": row[1],
+                "max": row[2],
+                "avg": row[3]
+            }
+            for row in rows
+        ]
+
+        held = sum(row[4] for row in rows if row[3] is not None)
+        return {
+            "days": days,
+            "summary": {
+                "min": min((point["min"] for point in series), default=None),
+                "max": max((point["max"] for point in series), default=None),
+                "avg": sum(row[3] * row[4] for row in rows if row[3] is not None) / held if held else None
+            },
+            "series": series
+        }
+
+    @cached
     async def get_characteristics(self, request: Request):
         try:
             product_id = request.query.get("product_id")
             row = await self._db.get_characteristics(product_id=product_id)
-            return self.response(data=json.loads(row[0]) if row[0] else {})
+            return self.response(data=RawJSON(row[0]) if row and row[0] else {})
         except Exception as e:
             self._logger.error(f"{e} {traceback.format_exc()}")
 
+    @cached
     async def get_categories(self, request: Request):
         try:
             parent_id = request.query.get("id")
@@ -140,56 +432,18 @@ class MarketAnalysisController:
 
     async def get_filters(self, request: Request):
         try:
-            return self.response(data={
-                "sort": [
-                    {
-                        "id": "relevance",
-                        "name": "Новинки"
-                    },
-                    {
-                        "id": "rating",
-                        "name": "Высокий рейтинг"
-                    },
-                    {
-                        "id": "cheap",
-                        "name": "Сначала дешевые"
-                    },
-                    {
-                        "id": "expensive",
-                        "name": "Сначала дорогие"
-                    }
-                ],
-                "price": [
-                    {
-                        "id": "10",
-                        "name": "до 10 000 т"
-                    },
-                    {
-                        "id": "10to50",
-                        "name": "10 000 - 49 999 т"
-                    },
-                    {
-                        "id": "50to100",
-                        "name": "50 000 - 99 999 т"
-                    },
-                    {
-                        "id": "100to150",
-                        "name": "100 000 - 149 999 т"
-                    },
-                    {
-                        "id": "150to200",
-                        "name": "150 000 - 199 999 т"
-                    },
-                    {
-                        "id": "200to500",
-                        "name": "200 000 - 499 999 т"
-                    },
-                    {
-                        "id": "more500",
-                        "name": "более 500 000 т"
-                    }
-                ]
-            })
+            return self.response(data=self.FILTERS)
+        except Exception as e:
+            self._logger.error(f"{e} {traceback.format_exc()}")
+
+    async def get_pool_stats(self, request: Request):
+        try:
+            return self.response(data=self._db.get_pool_stats())
         except Exception as e:
             self._logger.error(f"{e} {traceback.format_exc()}")
 
+    async def get_cache_stats(self, request: Request):
+        try:
+            return self.response(data=self._cache.get_stats())
+        except Exception as e:
+            self._logger.error(f"{e} {traceback.format_exc()}")
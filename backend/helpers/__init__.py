@@ -1 +1,3 @@
-from .database import Database
\ No newline at end of file
+from .database import Database
+from .cache import ResponseCache
+from .http import RawJSON, json_response, make_compression_middleware, make_conditional_middleware
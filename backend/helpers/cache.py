@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import OrderedDict
+from logging import Logger
+
+from .database import Database
+
+
+class ResponseCache:
+    """
+    LRU cache with TTL for controller responses. Entries are dropped when the parser
+    bumps the catalogue version, concurrent misses for the same key share one load.
+    """
+
+    def __init__(self, config: dict, logger: Logger, db: Database):
+        self._config = config.get("cache", {})
+        self._logger = logger
+        self._db = db
+        self._entries = OrderedDict()
+        self._loading = dict()
+        self._version = None
+        self._updated_at = None
+        self._version_checked_at = 0.0
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(name: str, query) -> tuple:
+        return name, tuple(sorted((k, v) for k, v in query.items() if v != ''))
+
+    async def get_or_load(self, key: tuple, loader):
+        await self._check_version()
+
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+        future = self._loading.get(key)
+        if future:
+            self._stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the loading request was cancelled, the load is started again
+                return await self.get_or_load(key=key, loader=loader)
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+            if value is not None:
+                self._set(key=key, value=value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            # cancellation is not an Exception, waiters must not be left on an unresolved future
+            if not future.done():
+                future.cancel()
+            self._loading.pop(key, None)
+
+    async def get_version(self) -> tuple:
+        await self._check_version()
+        return self._version, self._updated_at
+
+    def clear(self):
+        self._entries.clear()
+        self._db.clear_counts()
+        self._stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "max_size": self._config.get("max_size", 1024),
+            "version": self._version
+        }
+
+    def _set(self, key: tuple, value):
+        self._entries[key] = (time.monotonic() + self._config.get("ttl", 600), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._config.get("max_size", 1024):
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    async def _check_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self._config.get("version_check_interval", 5):
+            return
+
+        self._version_checked_at = now
+        try:
+            version, updated_at = await self._db.get_catalogue_version()
+        except Exception as e:
+            self._logger.error(f"Failed to check catalogue version: {e}")
+            return
+
+        if self._version is not None and version != self._version:
+            self._logger.info(f"Catalogue version changed {self._version} -> {version}, clearing cache")
+            self.clear()
+        self._version = version
+        self._updated_at = updated_at
@@ -1,7 +1,14 @@
+import datetime
+import json
+import time
+
 import asyncpg
+from contextlib import asynccontextmanager
 from logging import Logger
-from asyncpg import Connection
+from asyncpg import Connection, Pool
 from models import Category, Product
+from models.PriceHistory import PriceHistory
+from models.ProductCategory import ProductCategory
 from models.Supplier import Supplier
 
 
@@ -9,16 +16,64 @@ class Database:
     def __init__(self, config: dict, logger: Logger):
         self._config = config
         self._logger = logger
-        self._pool = None
+        self._pool: Pool | None = None
+        self._waiting = 0
+        self._counts = dict()
 
-    async def create_connection(self) -> Connection:
-        return await asyncpg.connect(
+    async def create_pool(self) -> Pool:
+        pool_config = self._config.get('pool', {})
+        self._pool = await asyncpg.create_pool(
             user=self._config['connection']['user'],
             host=self._config['connection']['host'],
             port=self._config['connection']['port'],
             database=self._config['connection']['database'],
-            password=self._config['connection']['password']
+            password=self._config['connection']['password'],
+            min_size=pool_config.get('min_size', 2),
+            max_size=pool_config.get('max_size', 10),
+            max_inactive_connection_lifetime=pool_config.get('idle_timeout', 300.0),
+            statement_cache_size=pool_config.get('statement_cache_size', 100)
         )
+        self._logger.info(f"Database pool created with size {self._pool.get_min_size()}-{self._pool.get_max_size()}")
+        return self._pool
+
+    async def close_pool(self):
+        if self._pool is None:
+            return
+
+        await self._pool.close()
+        self._pool = None
+        self._logger.info("Database pool closed")
+
+    @asynccontextmanager
+    async def acquire(self) -> Connection:
+        if self._pool is None:
+            raise Exception("Database pool is not created")
+
+        self._waiting += 1
+        try:
+            conn = await self._pool.acquire(timeout=self._config.get('pool', {}).get('acquire_timeout', 10.0))
+        finally:
+            self._waiting -= 1
+
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    def get_pool_stats(self) -> dict:
+        if self._pool is None:
+            return {"size": 0, "min_size": 0, "max_size": 0, "in_use": 0, "idle": 0, "waiters": 0}
+
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "size": size,
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "in_use": size - idle,
+            "idle": idle,
+            "waiters": self._waiting
+        }
 
     async def get_product(self, id: str):
         query = f'''
@@ -27,159 +82,395 @@ class Database:
                 p.name,
                 image,
                 p.rating,
-                max(price) as price,
+                p.max_price as price,
                 description
             FROM {Product.TABLE} p
-            INNER JOIN {Supplier.TABLE} s on p.id = s.product_id
-            WHERE p.id='{id}'
-            GROUP BY p.id
+            WHERE p.id = $1 AND p.offers > 0
         '''
 
-        conn = await self.create_connection()
-        row = await conn.fetchrow(query)
+        async with self.acquire() as conn:
+            row = await conn.fetchrow(query, id)
         return row
 
-    async def get_products(self, offset: int, limit: int, **kwargs):
+    async def get_products(self, offset: int, limit: int, after: list | None = None, **kwargs):
+        args = []
+        sort_key, _ = self._make_sort_filter(kwargs.get("sort") or "relevance")
+        where = self.make_product_where(kwargs=kwargs, args=args, after=after)
+        orderby = self.make_product_orderby(kwargs=kwargs)
+        args.extend([offset, limit])
+        # the window count reads every row past the seek point, cursor pages count separately
+        total = ",\n                count(*) OVER () as total" if after is None else ''
+
         query = f'''
             SELECT
                 p.id,
                 p.name,
                 image,
                 p.rating,
-                max(price) as price
+                p.max_price as price,
+                {sort_key} as sort_key{total}
             FROM {Product.TABLE} p
-            INNER JOIN {Supplier.TABLE} s on p.id = s.product_id
-            {self.make_product_where(kwargs=kwargs)}
-            GROUP BY p.id
-            {self.make_product_orderby(kwargs=kwargs)}
-            OFFSET {offset}
-            LIMIT {limit}
+            {where}
+            {orderby}
+            OFFSET ${len(args) - 1}
+            LIMIT ${len(args)}
         '''
 
-        conn = await self.create_connection()
-        rows = await conn.fetch(query)
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, *args)
         return rows
 
-    async def get_products_count(self, **kwargs):
-        query = f'''
-            WITH prods AS (
-                SELECT p.id
-                FROM {Product.TABLE} p
-                INNER JOIN {Supplier.TABLE} s on p.id = s.product_id
-                {self.make_product_where(kwargs=kwargs)}
-                GROUP BY p.id
-            )
-            SELECT count(*) FROM prods;
-        '''
+    async def get_products_count(self, approximate: bool = False, **kwargs):
+        """
+        Exact count by default. In approximate mode counts of filters without price range
+        or facets are served from a TTL cache, so they may lag behind by up to the TTL.
+        """
+        if approximate and not kwargs.get("price") and not kwargs.get("facets"):
+            cached = self._counts.get(kwargs.get("category_id") or '')
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+        total = await self._get_products_count_exact(**kwargs)
+        self.set_products_count(total=total, **kwargs)
+        return total
+
+    def set_products_count(self, total: int, **kwargs):
+        if kwargs.get("price") or kwargs.get("facets"):
+            return
 
-        conn = await self.create_connection()
-        row = await conn.fetchrow(query)
+        self._counts[kwargs.get("category_id") or ''] = (time.monotonic() + self._config.get('count', {}).get('ttl', 300), total)
+
+    def clear_counts(self):
+        self._counts.clear()
+
+    async def _get_products_count_exact(self, **kwargs):
+        args = []
+        query = f'''SELECT count(*) FROM {Product.TABLE} p {self.make_product_where(kwargs=kwargs, args=args)};'''
+
+        async with self.acquire() as conn:
+            row = await conn.fetchrow(query, *args)
         return row[0]
 
-    def make_product_where(self, kwargs):
-        category = f"starts_with(category_id, '{kwargs.get('category_id')}')" if kwargs.get("category_id") else None
-        price = self._make_price_filter(kwargs.get("price")) if kwargs.get("price") else None
+    def make_product_where(self, kwargs: dict, args: list, after: list | None = None) -> str:
+        """
+        Builds WHERE clause with $n placeholders and appends bind values to args.
+        Clause text depends only on which filters are present, so the number of
+        distinct statements stays fixed and asyncpg statement cache is reused.
+        When after is given, adds keyset condition that seeks past the (sort key, id)
+        of the last row of the previous page.
+        """
+        conditions = ["p.offers > 0"]
+
+        if kwargs.get("category_id"):
+            args.append(f"{self._escape_like(kwargs['category_id'])}%")
+            conditions.append(self._make_category_filter(product_id="p.id", param=len(args)))
+
+        if kwargs.get("price"):
+            low, high = self._make_price_filter(kwargs["price"])
+            args.extend([low, high])
+            conditions.append(f"p.max_price >= ${len(args) - 1}::float8 AND p.max_price < ${len(args)}::float8")
 
-        where = category if category else ''
-        if where and price:
-            where = f"{where} AND {price}"
-        elif price:
-            where = price
+        # values of one facet are alternatives, different facets must all match
+        for code, values in (kwargs.get("facets") or {}).items():
+            options = list()
+            for value in values:
+                args.append(json.dumps({code: {"values": [value]}}, ensure_ascii=False))
+                options.append(f"p.facets @> ${len(args)}::jsonb")
+            conditions.append(f"({' OR '.join(options)})")
 
-        return f"WHERE {where}" if where else ''
+        if after:
+            # sort keys of listed products are never NULL, a NULL would drop the row out of every page
+            sort_key, direction = self._make_sort_filter(kwargs.get("sort") or "relevance")
+            args.extend(after)
+            operator = "<" if direction == "DESC" else ">"
+            conditions.append(f"({sort_key}, p.id) {operator} (${len(args) - 1}, ${len(args)})")
+
+        return f"WHERE {' AND '.join(conditions)}"
 
     def make_product_orderby(self, kwargs: dict):
-        sort = self._make_sort_filter(kwargs.get("sort")) if kwargs.get("sort") else None
-        orderby = sort if sort else "relevance DESC"
-        return f"ORDER BY {orderby}" if orderby else ''
+        sort_key, direction = self._make_sort_filter(kwargs.get("sort") or "relevance")
+        return f"ORDER BY {sort_key} {direction}, p.id {direction}"
 
-    async def search_products(self, query: str, offset: int, limit: int):
-        query = f'''
+    async def search_products(self, query: str, offset: int, limit: int, after: list | None = None):
+        """
+        Full-text match over name and description plus trigram match over name,
+        ranked by text rank and name similarity.
+        """
+        args = [query or '', self._make_like_pattern(query)]
+        keyset = ''
+        if after:
+            args.extend(after)
+            keyset = "WHERE (rank, rating, id) < ($3, $4, $5)"
+        args.extend([offset, limit])
+        total = ",\n                count(*) OVER () as total" if after is None else ''
+
+        sql = f'''
             SELECT
-                p.id,
-                p.name,
+                id,
+                name,
                 image,
-                p.rating,
-                max(price) as price
-            FROM {Product.TABLE} p
-            INNER JOIN {Supplier.TABLE} s on p.id = s.product_id
-            WHERE p.name ilike '%{query}%'
-            GROUP BY p.id
-            ORDER BY p.rating DESC, max(s.price) DESC
-            OFFSET {offset}
-            LIMIT {limit};
+                rating,
+                price,
+                rank{total}
+            FROM (
+                SELECT
+                    p.id,
+                    p.name,
+                    p.image,
+                    p.rating,
+                    p.max_price as price,
+                    (ts_rank_cd(p.search_vector, websearch_to_tsquery('russian', $1)) + similarity(p.name, $1))::float8 as rank
+                FROM {Product.TABLE} p
+                WHERE {self.make_search_where()}
+            ) found
+            {keyset}
+            ORDER BY rank DESC, rating DESC, id DESC
+            OFFSET ${len(args) - 1}
+            LIMIT ${len(args)};
         '''
 
-        conn = await self.create_connection()
-        rows = await conn.fetch(query)
+        async with self.acquire() as conn:
+            rows = await conn.fetch(sql, *args)
         return rows
 
     async def get_search_products_count(self, query: str):
-        query = f'''SELECT count(*) FROM {Product.TABLE} p WHERE p.name ilike '%{query}%';'''
-        conn = await self.create_connection()
-        row = await conn.fetchrow(query)
+        sql = f'''SELECT count(*) FROM {Product.TABLE} p WHERE {self.make_search_where()};'''
+        async with self.acquire() as conn:
+            row = await conn.fetchrow(sql, query or '', self._make_like_pattern(query))
         return row[0]
 
-    async def get_suppliers(self, product_id: str):
+    @staticmethod
+    def make_search_where() -> str:
+        return "(p.search_vector @@ websearch_to_tsquery('russian', $1) OR p.name ilike $2) AND p.offers > 0"
+
+    async def suggest_products(self, prefix: str, limit: int):
+        query = f'''
+            SELECT p.id, p.name
+            FROM {Product.TABLE} p
+            WHERE p.name ilike $1 AND p.offers > 0
+            ORDER BY similarity(p.name, $2) DESC, p.rating DESC, p.id
+            LIMIT $3;
+        '''
+
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, f"{self._escape_like(prefix)}%", prefix, limit)
+        return rows
+
+    async def get_catalogue_version(self):
+        query = '''SELECT version, updated_at FROM catalogue_version WHERE id = 1;'''
+
+        async with self.acquire() as conn:
+            row = await conn.fetchrow(query)
+        return row
+
+    async def get_suppliers(self, product_id: str, city_id: str = None):
         query = f'''
             SELECT
                 id,
                 name,
                 price,
-                rating
+                rating,
+                city_id
             FROM {Supplier.TABLE} s
-            WHERE product_id='{product_id}'
+            WHERE product_id = $1 AND ($2::text IS NULL OR city_id = $2)
             ORDER BY price
         '''
 
-        conn = await self.create_connection()
-        rows = await conn.fetch(query)
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, product_id, city_id)
         return rows
 
     async def get_characteristics(self, product_id: str):
-        query = f'''SELECT characteristics FROM {Product.TABLE} WHERE id='{product_id}';'''
+        query = f'''SELECT characteristics FROM {Product.TABLE} WHERE id = $1;'''
 
-        conn = await self.create_connection()
-        row = await conn.fetchrow(query)
+        async with self.acquire() as conn:
+            row = await conn.fetchrow(query, product_id)
         return row
 
+    async def get_products_by_ids(self, ids: list):
+        query = f'''
+            SELECT
+                p.id,
+                p.name,
+                image,
+                p.rating,
+                p.max_price as price,
+                description
+            FROM {Product.TABLE} p
+            WHERE p.id = ANY($1) AND p.offers > 0
+        '''
+
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, ids)
+        return rows
+
+    async def get_suppliers_by_product_ids(self, product_ids: list):
+        query = f'''
+            SELECT
+                id,
+                name,
+                price,
+                rating,
+                product_id,
+                city_id
+            FROM {Supplier.TABLE} s
+            WHERE product_id = ANY($1)
+            ORDER BY product_id, price
+        '''
+
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, product_ids)
+        return rows
+
+    async def get_category_facets(self, category_id: str):
+        query = '''
+            SELECT code, name, value, products
+            FROM category_facets
+            WHERE category_id = $1
+            ORDER BY code, products DESC, value
+        '''
+
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, category_id)
+        return rows
+
+    async def get_price_series(self, window: datetime.timedelta, bucket: datetime.timedelta, product_id: str = None,
+                               category_id: str = None, city_id: str = None):
+        """
+        Prices held by the matching offers during the window, in buckets of the given width.
+        Every offer starts with its last price observed before the window, each price is held
+        until the next change, so buckets without changes still carry the price and avg is
+        weighted by holding time. The last column is the bucket weight in offer-seconds.
+        """
+        args = [window, bucket]
+        conditions = list()
+
+        if product_id:
+            args.append(product_id)
+            conditions.append(f"s.product_id = ${len(args)}")
+
+        if category_id:
+            args.append(f"{self._escape_like(category_id)}%")
+            conditions.append(self._make_category_filter(product_id="s.product_id", param=len(args)))
+
+        if city_id:
+            args.append(city_id)
+            conditions.append(f"s.city_id = ${len(args)}")
+
+        overlap = "extract(epoch FROM least(h.held_until, b.bucket_until) - greatest(h.held_from, b.bucket_from))::float8"
+        query = f'''
+            WITH window_start AS (
+                SELECT (now() - $1::interval)::timestamp AS at
+            ),
+            offers AS (
+                SELECT s.product_id, s.city_id, s.name
+                FROM {Supplier.TABLE} s
+                WHERE {' AND '.join(conditions) or 'true'}
+            ),
+            observations AS (
+                SELECT o.product_id, o.city_id, o.name, seed.price, w.at AS observed_at
+                FROM offers o
+                CROSS JOIN window_start w
+                CROSS JOIN LATERAL (
+                    SELECT h.price FROM {PriceHistory.TABLE} h
+                    WHERE h.product_id = o.product_id AND h.city_id = o.city_id AND h.name = o.name AND h.observed_at < w.at
+                    ORDER BY h.observed_at DESC
+                    LIMIT 1
+                ) seed
+                UNION ALL
+                SELECT h.product_id, h.city_id, h.name, h.price, h.observed_at
+                FROM offers o
+                JOIN {PriceHistory.TABLE} h ON h.product_id = o.product_id AND h.city_id = o.city_id AND h.name = o.name
+                WHERE h.observed_at >= (SELECT at FROM window_start)
+            ),
+            held AS (
+                SELECT
+                    price,
+                    observed_at AS held_from,
+                    coalesce(
+                        lead(observed_at) OVER (PARTITION BY product_id, city_id, name ORDER BY observed_at),
+                        now()::timestamp
+                    ) AS held_until
+                FROM observations
+            ),
+            buckets AS (
+                SELECT b AS bucket_from, b + $2::interval AS bucket_until
+                FROM window_start w, generate_series(w.at, now()::timestamp, $2::interval) b
+            )
+            SELECT
+                b.bucket_from,
+                min(h.price),
+                max(h.price),
+                sum(h.price * {overlap}) / nullif(sum({overlap}), 0),
+                sum({overlap})
+            FROM buckets b
+            JOIN held h ON h.held_from < b.bucket_until AND h.held_until > b.bucket_from
+            GROUP BY 1
+            ORDER BY 1
+        '''
+
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, *args)
+        return rows
+
+    async def get_characteristics_by_ids(self, product_ids: list):
+        query = f'''SELECT id, characteristics FROM {Product.TABLE} WHERE id = ANY($1);'''
+
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, product_ids)
+        return rows
+
     async def get_categories(self, parent_id: str) -> list:
         query = f'''
             SELECT id, name, code
             FROM {Category.TABLE}
-            WHERE parent_id = '{parent_id if parent_id else ''}';
+            WHERE parent_id = $1;
         '''
-        conn = await self.create_connection()
-        rows = await conn.fetch(query)
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, parent_id if parent_id else '')
 
         return rows
 
-    def _make_sort_filter(self, sort: dict) -> str:
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        return (value or '').replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    def _make_like_pattern(self, query: str) -> str:
+        return f"%{self._escape_like(query)}%"
+
+    @staticmethod
+    def _make_category_filter(product_id: str, param: int) -> str:
+        # a product listed in several categories matches each of them and their parents
+        return f'''EXISTS (
+            SELECT 1 FROM {ProductCategory.TABLE} pc WHERE pc.product_id = {product_id} AND pc.category_id LIKE ${param}
+        )'''
+
+    def _make_sort_filter(self, sort: str) -> tuple:
         if sort == "relevance":
-            return "relevance DESC"
+            return "p.relevance", "DESC"
         elif sort == "rating":
-            return "rating DESC"
+            return "p.rating", "DESC"
         elif sort == "cheap":
-            return "price ASC"
+            return "p.max_price", "ASC"
         elif sort == "expensive":
-            return "price DESC"
+            return "p.max_price", "DESC"
         else:
             raise Exception("Incorrect sort filter")
 
-    def _make_price_filter(self, price: str) -> str:
+    def _make_price_filter(self, price: str) -> tuple:
         if price == "10":
-            return f"price < 10000"
+            return 0.0, 10000.0
         elif price == "10to50":
-            return f"price BETWEEN 10000 AND 50000"
+            return 10000.0, 50000.0
         elif price == "50to100":
-            return f"price BETWEEN 50000 AND 100000"
+            return 50000.0, 100000.0
         elif price == "100to150":
-            return f"price BETWEEN 100000 AND 150000"
+            return 100000.0, 150000.0
         elif price == "150to200":
-            return f"price BETWEEN 150000 AND 200000"
+            return 150000.0, 200000.0
         elif price == "200to500":
-            return f"price BETWEEN 200000 AND 500000"
+            return 200000.0, 500000.0
         elif price == "more500":
-            return f"price > 500000"
+            return 500000.0, float("inf")
         else:
             raise Exception("Incorrect price filter")
@@ -0,0 +1,152 @@
+import datetime
+import gzip
+import hashlib
+import json
+import uuid
+
+from aiohttp import web
+from aiohttp.helpers import ETag
+
+from .cache import ResponseCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class RawJSON:
+    """
+    Already serialized JSON that is embedded into the response as is.
+    """
+
+    def __init__(self, value: str | bytes):
+        self.value = value.encode() if isinstance(value, str) else value
+
+
+def dumps(data) -> bytes:
+    if isinstance(data, dict) and len(data) == 1 and isinstance(data.get("data"), RawJSON):
+        return b'{"data":' + data["data"].value + b'}'
+
+    if orjson is not None and hasattr(orjson, "Fragment"):
+        return orjson.dumps(data, default=lambda value: _embed(value, orjson.Fragment), option=orjson.OPT_NON_STR_KEYS)
+
+    # nested RawJSON values are serialized as unique placeholders and spliced in afterwards
+    fragments = dict()
+    token = uuid.uuid4().hex
+
+    def placeholder(value):
+        key = f"{token}:{len(fragments)}"
+        fragments[f'"{key}"'.encode()] = _embed(value, lambda raw: raw)
+        return key
+
+    if orjson is not None:
+        body = orjson.dumps(data, default=placeholder, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=placeholder).encode()
+
+    for key, value in fragments.items():
+        body = body.replace(key, value, 1)
+    return body
+
+
+def _embed(value, wrap):
+    if isinstance(value, RawJSON):
+        return wrap(value.value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_response(data) -> web.Response:
+    return web.Response(body=dumps(data), content_type="application/json")
+
+
+def make_conditional_middleware(config: dict, cache: ResponseCache):
+    """
+    Adds ETag, Last-Modified and Cache-Control to catalogue endpoints and answers
+    If-None-Match / If-Modified-Since with 304. Validators are derived from the
+    catalogue version, so a match is resolved without touching the handler. Answers that
+    also depend on the current time, like price series, must stay out of http_cache.
+    """
+    endpoints = config.get("http_cache", {})
+
+    @web.middleware
+    async def conditional_middleware(request: web.Request, handler):
+        max_age = endpoints.get(request.path)
+        if max_age is None or request.method not in ("GET", "HEAD"):
+            return await handler(request)
+
+        version, updated_at = await cache.get_version()
+        if version is None:
+            return await handler(request)
+
+        digest = hashlib.sha1(request.path_qs.encode()).hexdigest()[:16]
+        etag = f"{version}-{digest}"
+        last_modified = updated_at.replace(microsecond=0)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+
+        if is_not_modified(request=request, etag=etag, last_modified=last_modified):
+            response = web.Response(status=304)
+        else:
+            response = await handler(request)
+            # controllers answer null when the handler failed, such responses must not be cached
+            if response.status != 200 or response.body == b"null":
+                return response
+
+        # weak, since compression middleware may vary the encoded body
+        response.etag = ETag(value=etag, is_weak=True)
+        response.last_modified = last_modified
+        response.headers["Cache-Control"] = f"public, max-age={max_age}, must-revalidate"
+        return response
+
+    return conditional_middleware
+
+
+def is_not_modified(request: web.Request, etag: str, last_modified: datetime.datetime) -> bool:
+    if request.if_none_match:
+        return any(tag.value == etag or tag.value == "*" for tag in request.if_none_match)
+
+    if request.if_modified_since:
+        return last_modified <= request.if_modified_since
+
+    return False
+
+
+def make_compression_middleware(config: dict):
+    """
+    Compresses response bodies above the configured size with brotli or gzip,
+    whichever the client accepts, brotli preferred.
+    """
+    compression = config.get("compression", {})
+    min_size = compression.get("min_size", 1024)
+    level = compression.get("level", 5)
+
+    @web.middleware
+    async def compression_middleware(request: web.Request, handler):
+        response = await handler(request)
+        if not isinstance(response, web.Response) or response.body is None or "Content-Encoding" in response.headers:
+            return response
+
+        body = response.body
+        if not isinstance(body, bytes) or len(body) < min_size:
+            return response
+
+        accept_encoding = request.headers.get("Accept-Encoding", "").lower()
+        if brotli is not None and "br" in accept_encoding:
+            response.body = brotli.compress(body, quality=level)
+            response.headers["Content-Encoding"] = "br"
+        elif "gzip" in accept_encoding:
+            response.body = gzip.compress(body, compresslevel=level)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            return response
+
+        response.headers.add("Vary", "Accept-Encoding")
+        return response
+
+    return compression_middleware
@@ -8,7 +8,7 @@ from aiohttp import web
 from aiohttp_swagger import setup_swagger
 
 from controllers import MarketAnalysisController
-from helpers import Database
+from helpers import Database, ResponseCache, json_response, make_compression_middleware, make_conditional_middleware
 
 with open("config.json", 'r', encoding='utf-8') as file:
     config = json.load(file)
@@ -17,59 +17,112 @@ logging.config.dictConfig(config=config["logger"])
 logger = logging.getLogger(name=config["app"])
 
 database = Database(config=config, logger=logger)
+cache = ResponseCache(config=config, logger=logger, db=database)
 
 event_analysis_controller = MarketAnalysisController(
     config=config,
     logger=logger,
-    db=database
+    db=database,
+    cache=cache
 )
 
-app = web.Application()
+app = web.Application(middlewares=[
+    make_compression_middleware(config=config),
+    make_conditional_middleware(config=config, cache=cache)
+])
+
+
+async def on_startup(app):
+    await database.create_pool()
+
+
+async def on_cleanup(app):
+    await database.close_pool()
 
 
 async def get_product(request):
     response = await event_analysis_controller.get_product(request=request)
-    return web.json_response(response)
+    return json_response(response)
 
 
 async def get_products(request):
     response = await event_analysis_controller.get_products(request=request)
-    return web.json_response(response)
+    return json_response(response)
+
+
+async def get_products_batch(request):
+    response = await event_analysis_controller.get_products_batch(request=request)
+    return json_response(response)
 
 
 async def search_products(request):
     response = await event_analysis_controller.search_products(request=request)
-    return web.json_response(response)
+    return json_response(response)
+
+
+async def suggest_products(request):
+    response = await event_analysis_controller.suggest_products(request=request)
+    return json_response(response)
 
 
 async def get_suppliers(request):
     response = await event_analysis_controller.get_suppliers(request=request)
-    return web.json_response(response)
+    return json_response(response)
+
+
+async def get_product_prices(request):
+    response = await event_analysis_controller.get_product_prices(request=request)
+    return json_response(response)
+
+
+async def get_category_prices(request):
+    response = await event_analysis_controller.get_category_prices(request=request)
+    return json_response(response)
 
 
 async def get_categories(request):
     response = await event_analysis_controller.get_categories(request=request)
-    return web.json_response(response)
+    return json_response(response)
 
 
 async def get_characteristics(request):
     response = await event_analysis_controller.get_characteristics(request=request)
-    return web.json_response(response)
+    return json_response(response)
 
 
 async def get_filters(request):
     response = await event_analysis_controller.get_filters(request=request)
-    return web.json_response(response)
+    return json_response(response)
+
+
+async def get_pool_stats(request):
+    response = await event_analysis_controller.get_pool_stats(request=request)
+    return json_response(response)
 
 
+async def get_cache_stats(request):
+    response = await event_analysis_controller.get_cache_stats(request=request)
+    return json_response(response)
+
+
+app.on_startup.append(on_startup)
+app.on_cleanup.append(on_cleanup)
+
 app.router.add_get('/get/product', get_product)
 app.router.add_get('/get/product/suppliers', get_suppliers)
 app.router.add_get('/get/product/characteristics', get_characteristics)
+app.router.add_get('/get/product/prices', get_product_prices)
 app.router.add_get('/get/products', get_products)
+app.router.add_get('/get/products/batch', get_products_batch)
 app.router.add_get('/get/categories', get_categories)
+app.router.add_get('/get/category/prices', get_category_prices)
 app.router.add_get('/get/filters', get_filters)
 
 app.router.add_get('/search/products', search_products)
+app.router.add_get('/search/suggest', suggest_products)
+
+app.router.add_get('/monitoring/pool', get_pool_stats)
+app.router.add_get('/monitoring/cache', get_cache_stats)
 
 setup_swagger(app, swagger_url="/api/documentation", swagger_from_file="swagger.yaml", ui_version=3)
 
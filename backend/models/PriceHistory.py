@@ -0,0 +1,10 @@
+class PriceHistory:
+    TABLE = 'price_history'
+    COLUMNS = ["product_id", "city_id", "name", "price", "observed_at"]
+
+    def __init__(self, product_id: str, city_id: str, name: str, price: float, observed_at):
+        self.product_id = product_id
+        self.city_id = city_id
+        self.name = name
+        self.price = price
+        self.observed_at = observed_at
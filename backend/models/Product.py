@@ -1,10 +1,11 @@
 class Product:
     TABLE = 'products'
-    COLUMNS = ["id", "src_id", "category_id", "name", "image", "rating", "description", "characteristics", "relevance"]
+    COLUMNS = ["id", "src_id", "category_id", "name", "image", "rating", "description", "characteristics", "relevance",
+               "facets"]
     ON_CONFLICT = f"ON CONFLICT (name) DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in COLUMNS)}"
 
     def __init__(self, id: str or None, category_id: str, name: str, image: str, rating: float, description: str,
-                 characteristics: str):
+                 characteristics: str, facets: str = "{}"):
         self.id = id
         self.category_id = category_id
         self.name = name
@@ -12,3 +13,4 @@ class Product:
         self.rating = rating
         self.description = description
         self.characteristics = characteristics
+        self.facets = facets
@@ -0,0 +1,7 @@
+class ProductCategory:
+    TABLE = 'product_categories'
+    COLUMNS = ["product_id", "category_id"]
+
+    def __init__(self, product_id: str, category_id: str):
+        self.product_id = product_id
+        self.category_id = category_id
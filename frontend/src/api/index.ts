@@ -8,7 +8,10 @@ import type {
   ProductSupplierData,
   SearchParams,
   CategoryData,
-  FiltersData
+  FiltersData,
+  ProductBatchData,
+  PriceSeriesParams,
+  PriceSeriesData
 } from './types'
 
 type PromiseResponse<T> = Promise<{ data: T }>
@@ -32,9 +35,29 @@ class MarketAnalysisService {
       .then(this.getData)
   }
 
-  async getProductSuppliers(product_id: string): PromiseResponse<ProductSupplierData[]> {
+  async getProductSuppliers(product_id: string, city_id?: string): PromiseResponse<ProductSupplierData[]> {
     return await api
-      .get(`${this.RESOURCE}/product/suppliers`, { params: { product_id } })
+      .get(`${this.RESOURCE}/product/suppliers`, { params: { product_id, city_id } })
+      .then(this.getData)
+  }
+
+  async getProductPrices(product_id: string, params?: PriceSeriesParams): PromiseResponse<PriceSeriesData> {
+    return await api
+      .get(`${this.RESOURCE}/product/prices`, { params: { product_id, ...params } })
+      .then(this.getData)
+  }
+
+  async getCategoryPrices(category_id: string, params?: PriceSeriesParams): PromiseResponse<PriceSeriesData> {
+    return await api
+      .get(`${this.RESOURCE}/category/prices`, { params: { category_id, ...params } })
+      .then(this.getData)
+  }
+
+  async getBatch(ids: string[], include?: string[]): PromiseResponse<ProductBatchData> {
+    return await api
+      .get(`${this.RESOURCE}/products/batch`, {
+        params: { ids: ids.join(','), include: include?.join(',') }
+      })
       .then(this.getData)
   }
 
@@ -3,11 +3,20 @@ export interface GetAllProductsParams {
   category_id?: string
   sort?: string
   price?: string
+  facets?: string
+  cursor?: string
+}
+
+export interface FacetData {
+  code: string
+  name: string
+  values: { value: string; count: number }[]
 }
 
 export interface SearchParams {
   name: string
   page: number
+  cursor?: string
 }
 
 export interface ProductData {
@@ -23,6 +32,8 @@ export interface AllProductsData {
   total: number
   current: number
   pages: number
+  next_cursor: string | null
+  facets?: FacetData[] | null
   data: Omit<ProductData, 'description'>[]
 }
 
@@ -57,8 +68,42 @@ export interface ProductSupplierData {
   name: string
   price: number
   rating: number
+  city_id: string
+}
+
+export interface PriceSeriesParams {
+  days?: number
+  points?: number
+  city_id?: string
+}
+
+interface PricePointData {
+  time: string
+  min: number
+  max: number
+  avg: number
 }
 
+interface PriceSummaryData {
+  min: number | null
+  max: number | null
+  avg: number | null
+}
+
+export interface PriceSeriesData {
+  days: number
+  summary: PriceSummaryData
+  series: PricePointData[]
+}
+
+export interface ProductBatchItem {
+  product?: ProductData
+  suppliers?: ProductSupplierData[]
+  characteristics?: CharacteristicsData[]
+}
+
+export type ProductBatchData = Record<string, ProductBatchItem>
+
 interface SearchProductData {
   id: string
   name: string
@@ -0,0 +1,59 @@
+"""
+Per-page CPU time and peak Python memory of the data script extraction: the raw byte
+scan used by default against the full lxml tree it falls back to, both followed by the
+same chompjs parse.
+
+Run from the parsers directory: python -m benchmarks.extraction [--pages DIR] [--repeat N]
+"""
+import argparse
+import time
+import tracemalloc
+
+import chompjs
+
+from helpers.extract import CATALOG_MARKER, PRODUCT_MARKER, find_script, find_script_in_tree
+from .pages import load_pages
+
+
+def measure(find, content: bytes, marker: str, repeat: int) -> tuple:
+    started = time.process_time()
+    for _ in range(repeat):
+        chompjs.parse_js_object(find(content=content, marker=marker))
+    cpu = (time.process_time() - started) / repeat
+
+    tracemalloc.start()
+    chompjs.parse_js_object(find(content=content, marker=marker))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--pages", help="directory with saved catalog and product pages")
+    arguments.add_argument("--repeat", type=int, default=5)
+    options = arguments.parse_args()
+
+    totals = {"scan": [0.0, 0], "tree": [0.0, 0]}
+    print(f"{'page':<24} {'KiB':>6} {'scan ms':>9} {'scan KiB':>9} {'tree ms':>9} {'tree KiB':>9}")
+    for name, content in load_pages(options.pages):
+        marker = CATALOG_MARKER if CATALOG_MARKER.encode() in content else PRODUCT_MARKER
+        if find_script(content=content, marker=marker) is None:
+            print(f"{name:<24} skipped, no data script")
+            continue
+
+        scan = measure(find_script, content, marker, options.repeat)
+        tree = measure(find_script_in_tree, content, marker, options.repeat)
+        for key, (cpu, peak) in (("scan", scan), ("tree", tree)):
+            totals[key][0] += cpu
+            totals[key][1] = max(totals[key][1], peak)
+
+        print(f"{name:<24} {len(content) // 1024:>6} {scan[0] * 1e3:>9.2f} {scan[1] // 1024:>9} "
+              f"{tree[0] * 1e3:>9.2f} {tree[1] // 1024:>9}")
+
+    print(f"{'total / peak':<24} {'':>6} {totals['scan'][0] * 1e3:>9.2f} {totals['scan'][1] // 1024:>9} "
+          f"{totals['tree'][0] * 1e3:>9.2f} {totals['tree'][1] // 1024:>9}")
+
+
+if __name__ == "__main__":
+    main()
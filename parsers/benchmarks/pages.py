@@ -0,0 +1,75 @@
+"""
+Pages for the parsing benchmarks: saved fixture pages when a directory is given,
+otherwise synthetic pages shaped like kaspi.kz catalog and product pages.
+"""
+import json
+import os
+
+from helpers.extract import CATALOG_MARKER, PRODUCT_MARKER
+
+
+def load_pages(directory: str | None, count: int = 20) -> list:
+    """
+    Returns (name, content) pairs, fixture files are read as bytes in name order.
+    """
+    if directory:
+        return [
+            (name, open(os.path.join(directory, name), "rb").read())
+            for name in sorted(os.listdir(directory))
+            if os.path.isfile(os.path.join(directory, name))
+        ]
+
+    pages = [(f"catalog-{i}.html", make_catalog_page(i)) for i in range(count // 4 or 1)]
+    pages.extend((f"product-{i}.html", make_product_page(i)) for i in range(count - len(pages)))
+    return pages
+
+
+def make_catalog_page(seed: int, sub_nodes: int = 60) -> bytes:
+    data = {
+        "categoryInfo": {
+            "code": f"category_{seed}",
+            "title": f"Категория {seed}",
+            "subNodes": [
+                {"code": f"category_{seed}_{i}", "title": f"Подкатегория {i}", "link": f"c/category_{seed}_{i}/"}
+                for i in range(sub_nodes)
+            ]
+        }
+    }
+    return make_page(script=f"{CATALOG_MARKER} = {json.dumps(data, ensure_ascii=False)};")
+
+
+def make_product_page(seed: int, groups: int = 15, features: int = 12) -> bytes:
+    specifications = [
+        {
+            "name": f"Группа {g}",
+            "features": [
+                {
+                    "code": f"feature_{g}_{f}",
+                    "name": f"Характеристика {g}.{f}",
+                    "featureValues": [{"value": f"значение {(seed + g * features + f) % 37}"}]
+                }
+                for f in range(features)
+            ]
+        }
+        for g in range(groups)
+    ]
+    data = {
+        "card": {"id": str(100000000 + seed), "title": f"Смартфон Example Phone {seed} 128 ГБ", "rating": 4.8},
+        "description": "<p>Описание товара</p>" * 50,
+        "galleryImages": [{"medium": f"https://resources.kaspi.kz/img/m/p/{seed}-{i}.jpg"} for i in range(8)],
+        "specifications": specifications
+    }
+    return make_page(script=f"{PRODUCT_MARKER} {json.dumps(data, ensure_ascii=False)};")
+
+
+def make_page(script: str, blocks: int = 400) -> bytes:
+    # product pages carry a few hundred KiB of markup and other scripts around the data script
+    markup = "".join(
+        f'<div class="item-{i}"><a href="/shop/p/{i}/">Ссылка {i}</a><span data-id="{i}">{i * 7}</span></div>'
+        for i in range(blocks)
+    )
+    other = "".join(f"<script>window.analytics_{i} = {{\"id\": {i}}};</script>" for i in range(20))
+    return (
+        f"<!DOCTYPE html><html><head><title>kaspi.kz</title>{other}</head>"
+        f"<body>{markup}<script>{script}</script>{markup}</body></html>"
+    ).encode()
@@ -0,0 +1,62 @@
+"""
+Page parsing throughput against process pool size. Pages are parsed the way
+KaspiParser.run_parser does: inline on the event loop without workers, otherwise in a
+ProcessPoolExecutor through run_in_executor.
+
+Run from the parsers directory: python -m benchmarks.process_pool [--pages DIR] [--workers 0,1,2,4] [--rounds N]
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from helpers.extract import CATALOG_MARKER, parse_catalog_page, parse_product_page
+from .pages import load_pages
+
+
+async def parse_all(pages: list, executor: ProcessPoolExecutor | None) -> float:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, func, content) if executor is not None else asyncio.sleep(0, func(content))
+        for func, content in pages
+    ))
+    if not all(results):
+        raise Exception("Some pages were not parsed")
+    return time.perf_counter() - started
+
+
+async def measure(pages: list, workers: int, rounds: int) -> float:
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    try:
+        if executor is not None:
+            # starts the worker processes before timing
+            await parse_all(pages[:workers], executor)
+        elapsed = sum([await parse_all(pages, executor) for _ in range(rounds)])
+        return len(pages) * rounds / elapsed
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    arguments = argparse.ArgumentParser()
+    arguments.add_argument("--pages", help="directory with saved catalog and product pages")
+    arguments.add_argument("--workers", default=",".join(str(n) for n in sorted({0, 1, 2, 4, cpus})))
+    arguments.add_argument("--rounds", type=int, default=3)
+    options = arguments.parse_args()
+
+    pages = [
+        (parse_catalog_page if CATALOG_MARKER.encode() in content else parse_product_page, content)
+        for _, content in load_pages(options.pages, count=100)
+    ]
+    print(f"{len(pages)} pages, {cpus} cpus")
+    print(f"{'workers':>8} {'pages/s':>10}")
+    for workers in (int(value) for value in options.workers.split(",")):
+        print(f"{workers:>8} {asyncio.run(measure(pages, workers, options.rounds)):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
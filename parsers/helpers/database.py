@@ -1,56 +1,514 @@
+import datetime
+import json
+import os
+from contextlib import asynccontextmanager
+
 import asyncpg
 from logging import Logger
 
-from asyncpg import Connection
+from asyncpg import Connection, Pool
 
 from models import Category, Product
+from models.Image import Image
+from models.PriceHistory import PriceHistory
+from models.ProductCategory import ProductCategory
+from models.Supplier import Supplier
 
 
 class Database:
     def __init__(self, config: dict, logger: Logger):
         self._config = config
         self._logger = logger
-        self._pool = None
+        self._pool: Pool | None = None
 
-    async def create_connection(self) -> Connection:
-        return await asyncpg.connect(
+    async def create_pool(self) -> Pool:
+        pool_config = self._config.get('pool', {})
+        self._pool = await asyncpg.create_pool(
             user=self._config['connection']['user'],
             host=self._config['connection']['host'],
             port=self._config['connection']['port'],
             database=self._config['connection']['database'],
-            password=self._config['connection']['password']
+            password=self._config['connection']['password'],
+            min_size=pool_config.get('min_size', 1),
+            max_size=pool_config.get('max_size', 4)
         )
+        return self._pool
+
+    async def close_pool(self):
+        if self._pool is None:
+            return
+
+        await self._pool.close()
+        self._pool = None
+
+    @asynccontextmanager
+    async def acquire(self) -> Connection:
+        if self._pool is None:
+            raise Exception("Database pool is not created")
+
+        async with self._pool.acquire() as conn:
+            yield conn
+
+    async def migrate(self):
+        directory = os.path.join(os.path.dirname(__file__), "../migrations")
+        async with self.acquire() as conn:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    name text PRIMARY KEY,
+                    applied_at timestamp NOT NULL DEFAULT now()
+                );
+            ''')
+            applied = {row[0] for row in await conn.fetch('''SELECT name FROM schema_migrations;''')}
+
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(".sql") or filename in applied:
+                    continue
 
-    async def insert(self, data: list, table: str, columns: list, on_conflict='ON CONFLICT DO NOTHING'):
+                with open(os.path.join(directory, filename), 'r', encoding='utf-8') as file:
+                    script = file.read()
+
+                async with conn.transaction():
+                    await conn.execute(script)
+                    await conn.execute('''INSERT INTO schema_migrations (name) VALUES ($1);''', filename)
+                self._logger.info(f"Applied migration {filename}")
+
+    async def insert(self, data: list, table: str, columns: list, on_conflict='ON CONFLICT DO NOTHING', unique: list = None):
+        """
+        COPYs rows into a temporary staging table and merges them with one INSERT ... SELECT.
+        When unique columns are given, only the last row per key is merged, since
+        ON CONFLICT DO UPDATE cannot touch the same row twice in one statement.
+        """
+        if not data:
+            return
+
+        schema = self._config['connection']['schema']
+        staging = f"staging_{table}"
         column_names = ', '.join(columns)
-        placeholders = ', '.join(['$' + str(i) for i in range(1, len(columns) + 1)])
-        query = f'''INSERT INTO {self._config['connection']['schema']}.{table} ({column_names}) VALUES ({placeholders}) {on_conflict};'''
 
-        conn = await self.create_connection()
-        await conn.executemany(query, data)
+        select = f"SELECT {column_names} FROM {staging}"
+        if unique:
+            keys = ', '.join(unique)
+            select = f"SELECT DISTINCT ON ({keys}) {column_names} FROM {staging} ORDER BY {keys}, staging_seq DESC"
 
-    async def get_product_id(self, src_id: str, name: str) -> int or None:
-        query = f'''SELECT id FROM {Product.TABLE} WHERE src_id = $1 AND name = $2;'''
-        conn = await self.create_connection()
-        rows = await conn.fetch(query, src_id, name)
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await self._copy_to_staging(conn=conn, data=data, table=table, columns=columns)
+                await conn.execute(f'''INSERT INTO {schema}.{table} ({column_names}) {select} {on_conflict};''')
 
-        return rows[0][0] if len(rows) > 0 else None
+    async def insert_price_changes(self, data: list):
+        """
+        Appends observations of offers whose price differs from the stored one,
+        must run before the offers themselves are upserted.
+        """
+        if not data:
+            return
+
+        schema = self._config['connection']['schema']
+        staging = f"staging_{PriceHistory.TABLE}"
+        column_names = ', '.join(PriceHistory.COLUMNS)
+        keys = ', '.join(PriceHistory.UNIQUE)
+        query = f'''
+            INSERT INTO {schema}.{PriceHistory.TABLE} ({column_names})
+            SELECT o.product_id, o.city_id, o.name, o.price
+            FROM (
+                SELECT DISTINCT ON ({keys}) {column_names} FROM {staging} ORDER BY {keys}, staging_seq DESC
+            ) o
+            LEFT JOIN {schema}.{Supplier.TABLE} s ON s.product_id = o.product_id AND s.city_id = o.city_id AND s.name = o.name
+            WHERE s.price IS DISTINCT FROM o.price;
+        '''
+
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await self._copy_to_staging(conn=conn, data=data, table=PriceHistory.TABLE, columns=PriceHistory.COLUMNS)
+                await conn.execute(query)
+
+    async def insert_product_categories(self, data: list):
+        """
+        Memberships of products missing from the table are skipped, their product batch
+        failed to upload and the membership is recorded again on the next crawl.
+        """
+        if not data:
+            return
+
+        schema = self._config['connection']['schema']
+        staging = f"staging_{ProductCategory.TABLE}"
+        column_names = ', '.join(ProductCategory.COLUMNS)
+        query = f'''
+            INSERT INTO {schema}.{ProductCategory.TABLE} ({column_names})
+            SELECT DISTINCT m.product_id, m.category_id
+            FROM {staging} m
+            WHERE EXISTS (SELECT 1 FROM {schema}.{Product.TABLE} p WHERE p.id = m.product_id)
+            {ProductCategory.ON_CONFLICT};
+        '''
+
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await self._copy_to_staging(conn=conn, data=data, table=ProductCategory.TABLE, columns=ProductCategory.COLUMNS)
+                await conn.execute(query)
+
+    async def _copy_to_staging(self, conn: Connection, data: list, table: str, columns: list):
+        schema = self._config['connection']['schema']
+        staging = f"staging_{table}"
+        await conn.execute(f'''
+            CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS AS
+            SELECT {', '.join(columns)}, 0::bigint AS staging_seq FROM {schema}.{table} WITH NO DATA;
+        ''')
+        await conn.copy_records_to_table(
+            staging,
+            records=[(*row, seq) for seq, row in enumerate(data)],
+            columns=[*columns, "staging_seq"]
+        )
+
+    async def ensure_price_history_partitions(self):
+        query = '''
+            SELECT ensure_price_history_partition(now()::timestamp);
+            SELECT ensure_price_history_partition((now() + interval '1 month')::timestamp);
+        '''
+        async with self.acquire() as conn:
+            await conn.execute(query)
+
+    async def get_product_ids(self, src_ids: list) -> list:
+        query = f'''SELECT src_id, name, id, fingerprint, etag, last_modified FROM {Product.TABLE} WHERE src_id = ANY($1);'''
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, src_ids)
+
+        return rows
+
+    async def get_product_ids_as_dict(self) -> dict:
+        query = f'''SELECT src_id, name, id FROM {self._config['connection']['schema']}.{Product.TABLE};'''
+
+        result = {}
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, prefetch=10000):
+                    result[(str(row[0]), row[1])] = row[2]
+
+        return result
+
+    async def get_images_as_dict(self) -> dict:
+        query = f'''SELECT url, path FROM {self._config['connection']['schema']}.{Image.TABLE};'''
+
+        result = {}
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, prefetch=10000):
+                    result[row[0]] = row[1]
+
+        return result
+
+    async def update_product_images(self, data: list):
+        if not data:
+            return
+
+        query = f'''
+            UPDATE {Product.TABLE} p
+            SET image = v.path
+            FROM unnest($1::text[], $2::text[]) AS v(id, path)
+            WHERE p.id::text = v.id;
+        '''
+
+        async with self.acquire() as conn:
+            await conn.execute(query, [row[0] for row in data], [row[1] for row in data])
+
+    async def update_product_fingerprints(self, data: list):
+        if not data:
+            return
+
+        query = f'''
+            UPDATE {Product.TABLE} p
+            SET fingerprint = v.fingerprint
+            FROM unnest($1::text[], $2::text[]) AS v(id, fingerprint)
+            WHERE p.id::text = v.id;
+        '''
+
+        async with self.acquire() as conn:
+            await conn.execute(query, [row[0] for row in data], [row[1] for row in data])
 
     async def get_category_id(self, code: str) -> str or None:
         query = f'''SELECT id FROM {Category.TABLE} WHERE code = $1;'''
-        conn = await self.create_connection()
-        rows = await conn.fetch(query, code)
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, code)
 
         return rows[0][0] if len(rows) > 0 else None
 
     async def get_categories_as_dict(self) -> dict:
         query = f'''SELECT id, code FROM {self._config['connection']['schema']}.{Category.TABLE};'''
 
-        conn = await self.create_connection()
-        rows = await conn.fetch(query)
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query)
 
         result = {}
         for row in rows:
             result[row[1]] = row[0]
 
         return result
+
+    async def refresh_price_summary(self, product_ids: list):
+        query = f'''
+            UPDATE {Product.TABLE} p
+            SET
+                min_price = s.min_price,
+                max_price = s.max_price,
+                avg_price = s.avg_price,
+                offers = s.offers,
+                best_merchant_rating = s.best_merchant_rating
+            FROM (
+                SELECT
+                    product_id,
+                    min(price) AS min_price,
+                    max(price) AS max_price,
+                    avg(price) AS avg_price,
+                    count(price) AS offers,
+                    max(rating) AS best_merchant_rating
+                FROM {Supplier.TABLE}
+                WHERE product_id = ANY($1)
+                GROUP BY product_id
+            ) s
+            WHERE p.id = s.product_id;
+        '''
+
+        async with self.acquire() as conn:
+            await conn.execute(query, product_ids)
+
+    async def refresh_category_facets(self):
+        """
+        Rebuilds facet value counts of every category, products count once towards each
+        category they are listed in and all of its parents.
+        """
+        query = f'''
+            INSERT INTO category_facets (category_id, code, name, value, products)
+            SELECT
+                c.category_id,
+                f.key AS code,
+                min(f.value->>'name') AS name,
+                v.value,
+                count(*) AS products
+            FROM (
+                SELECT DISTINCT m.product_id, substr(m.category_id, 1, n) AS category_id
+                FROM {ProductCategory.TABLE} m
+                CROSS JOIN LATERAL generate_series(3, length(m.category_id), 3) AS n
+            ) c
+            JOIN {Product.TABLE} p ON p.id = c.product_id
+            CROSS JOIN LATERAL jsonb_each(p.facets) AS f
+            CROSS JOIN LATERAL jsonb_array_elements_text(f.value->'values') AS v
+            WHERE p.offers > 0
+            GROUP BY 1, 2, 4;
+        '''
+
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('''DELETE FROM category_facets;''')
+                await conn.execute(query)
+        self._logger.info("Category facets refreshed")
+
+    async def bump_catalogue_version(self):
+        query = '''UPDATE catalogue_version SET version = version + 1, updated_at = now() WHERE id = 1;'''
+        async with self.acquire() as conn:
+            await conn.execute(query)
+
+    async def start_crawl_generation(self, resume_window: datetime.timedelta) -> tuple:
+        """
+        Returns (generation, resumed). An unfinished generation started within resume_window
+        is resumed, otherwise a new one is started. Serialized with an advisory lock, so
+        parser processes starting together join the same generation.
+        """
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('''SELECT pg_advisory_xact_lock(hashtext('crawl_generations'));''')
+
+                generation = await conn.fetchval(
+                    '''
+                        SELECT id FROM crawl_generations
+                        WHERE finished_at IS NULL AND started_at >= now() - $1::interval
+                        ORDER BY id DESC
+                        LIMIT 1;
+                    ''',
+                    resume_window
+                )
+                if generation:
+                    return generation, True
+
+                generation = await conn.fetchval('''INSERT INTO crawl_generations DEFAULT VALUES RETURNING id;''')
+                return generation, False
+
+    async def finish_crawl_generation(self, generation: int):
+        query = '''UPDATE crawl_generations SET finished_at = now() WHERE id = $1 AND finished_at IS NULL;'''
+        async with self.acquire() as conn:
+            await conn.execute(query, generation)
+
+    async def get_frontier(self, kind: str, status: str, generation: int) -> list:
+        query = '''
+            SELECT key, payload FROM crawl_frontier
+            WHERE kind = $1 AND status = $2 AND generation = $3
+            ORDER BY updated_at;
+        '''
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, kind, status, generation)
+
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    async def add_frontier(self, kind: str, items: list, generation: int, parent_key: str | None = None):
+        """
+        Items of an older generation are reset to pending, items already added in this
+        generation are left as they are.
+        """
+        if not items:
+            return
+
+        query = '''
+            INSERT INTO crawl_frontier (key, kind, payload, generation, parent_key)
+            SELECT key, $1, payload::jsonb, $4, $5 FROM unnest($2::text[], $3::text[]) AS v(key, payload)
+            ON CONFLICT (key) DO UPDATE
+            SET status = 'pending', payload = EXCLUDED.payload, generation = EXCLUDED.generation,
+                parent_key = EXCLUDED.parent_key, updated_at = now(), completed_at = NULL,
+                leased_by = NULL, lease_until = NULL, attempts = 0
+            WHERE crawl_frontier.generation IS DISTINCT FROM EXCLUDED.generation;
+        '''
+
+        async with self.acquire() as conn:
+            await conn.execute(
+                query,
+                kind,
+                [item[0] for item in items],
+                [json.dumps(item[1]) for item in items],
+                generation,
+                parent_key
+            )
+
+    async def get_completed_frontier(self, keys: list, generation: int) -> list:
+        query = '''
+            SELECT key FROM crawl_frontier
+            WHERE key = ANY($1) AND status IN ('done', 'failed') AND generation = $2;
+        '''
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, keys, generation)
+
+        return rows
+
+    async def complete_frontier(self, keys: list, generation: int):
+        if not keys:
+            return
+
+        query = '''
+            INSERT INTO crawl_frontier (key, kind, status, completed_at, generation)
+            SELECT key, split_part(key, ':', 1), 'done', now(), $2 FROM unnest($1::text[]) AS key
+            ON CONFLICT (key) DO UPDATE
+            SET status = 'done', generation = EXCLUDED.generation, updated_at = now(), completed_at = now(),
+                leased_by = NULL, lease_until = NULL;
+        '''
+        async with self.acquire() as conn:
+            await conn.execute(query, keys, generation)
+            await self._complete_expanded_frontier(conn=conn, generation=generation)
+
+    async def expand_frontier(self, key: str, generation: int):
+        """
+        Marks a category whose sub-categories were added, it is completed together
+        with the last item of its subtree.
+        """
+        query = '''
+            UPDATE crawl_frontier
+            SET status = 'expanded', updated_at = now(), leased_by = NULL, lease_until = NULL
+            WHERE key = $1 AND status = 'pending' AND generation = $2;
+        '''
+        async with self.acquire() as conn:
+            await conn.execute(query, key, generation)
+            await self._complete_expanded_frontier(conn=conn, generation=generation)
+
+    async def _complete_expanded_frontier(self, conn, generation: int):
+        # one level per statement, repeated until no parent is left to complete
+        query = '''
+            UPDATE crawl_frontier f
+            SET status = 'done', updated_at = now(), completed_at = now()
+            WHERE f.status = 'expanded' AND f.generation = $1 AND NOT EXISTS (
+                SELECT 1 FROM crawl_frontier c
+                WHERE c.parent_key = f.key AND c.generation = $1 AND c.status NOT IN ('done', 'failed')
+            );
+        '''
+        while (await conn.execute(query, generation)) != "UPDATE 0":
+            pass
+
+    async def fail_frontier(self, key: str, max_attempts: int, generation: int):
+        """
+        Counts a failed attempt and releases the lease, so another node may retry the item
+        right away. After max_attempts the item is marked failed and counts as completed
+        for the rest of the generation.
+        """
+        query = '''
+            UPDATE crawl_frontier
+            SET
+                attempts = attempts + 1,
+                status = CASE WHEN attempts + 1 >= $2 THEN 'failed' ELSE status END,
+                completed_at = CASE WHEN attempts + 1 >= $2 THEN now() ELSE completed_at END,
+                updated_at = now(),
+                leased_by = NULL,
+                lease_until = NULL
+            WHERE key = $1 AND status = 'pending' AND generation = $3
+            RETURNING status;
+        '''
+        async with self.acquire() as conn:
+            status = await conn.fetchval(query, key, max_attempts, generation)
+            if status == "failed":
+                await self._complete_expanded_frontier(conn=conn, generation=generation)
+            return status
+
+    async def lease_frontier(self, kind: str, node: str, limit: int, lease: datetime.timedelta, generation: int) -> list:
+        query = '''
+            UPDATE crawl_frontier f
+            SET leased_by = $2, lease_until = now() + $4::interval
+            WHERE f.key IN (
+                SELECT key FROM crawl_frontier
+                WHERE kind = $1 AND status = 'pending' AND generation = $5
+                    AND (lease_until IS NULL OR lease_until < now())
+                ORDER BY updated_at
+                LIMIT $3
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING f.key, f.payload;
+        '''
+        async with self.acquire() as conn:
+            rows = await conn.fetch(query, kind, node, limit, lease, generation)
+
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    async def renew_frontier(self, keys: list, node: str, lease: datetime.timedelta):
+        query = '''
+            UPDATE crawl_frontier
+            SET lease_until = now() + $3::interval
+            WHERE key = ANY($1) AND leased_by = $2 AND status = 'pending';
+        '''
+        async with self.acquire() as conn:
+            await conn.execute(query, keys, node, lease)
+
+    async def has_pending_frontier(self, generation: int) -> bool:
+        # failed items are excluded, so nodes stop once only poison items are left
+        query = '''SELECT EXISTS (SELECT 1 FROM crawl_frontier WHERE status = 'pending' AND generation = $1);'''
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, generation)
+
+    async def allocate_category_id(self, parent_id: str, code: str, name: str) -> str:
+        """
+        Allocates next child id of parent and stores the category in one transaction.
+        Serialized per parent with an advisory lock, so parser processes never hand
+        out the same id.
+        """
+        schema = self._config['connection']['schema']
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('''SELECT pg_advisory_xact_lock(hashtext($1));''', f"{Category.TABLE}:{parent_id}")
+
+                id = await conn.fetchval(f'''SELECT id FROM {schema}.{Category.TABLE} WHERE code = $1;''', code)
+                if id:
+                    return id
+
+                last_id = await conn.fetchval(
+                    f'''SELECT max(id) FROM {schema}.{Category.TABLE} WHERE length(id) = $1 AND starts_with(id, $2);''',
+                    len(parent_id) + 3,
+                    parent_id
+                )
+                id = str(int(last_id) + 1).zfill(len(last_id)) if last_id else f"{parent_id}001"
+
+                await conn.execute(
+                    f'''INSERT INTO {schema}.{Category.TABLE} ({', '.join(Category.COLUMNS)}) VALUES ($1, $2, $3, $4) {Category.ON_CONFLICT};''',
+                    id, parent_id, code, name
+                )
+                return id
@@ -0,0 +1,113 @@
+import json
+
+import chompjs
+from bs4 import BeautifulSoup
+
+CATALOG_MARKER = "BACKEND.components.catalog"
+PRODUCT_MARKER = "BACKEND.components.item ="
+
+
+def find_script(content: bytes | str, marker: str) -> str | None:
+    """
+    Returns text of the <script> element containing marker by scanning raw page
+    content, without building a DOM.
+    """
+    if isinstance(content, str):
+        content = content.encode()
+
+    position = content.find(marker.encode())
+    if position < 0:
+        return None
+
+    start = content.rfind(b"<script", 0, position)
+    if start < 0:
+        return None
+
+    start = content.find(b">", start, position)
+    end = content.find(b"</script", position)
+    if start < 0 or end < 0:
+        return None
+
+    return content[start + 1:end].decode("utf-8", errors="replace")
+
+
+def find_script_in_tree(content: bytes | str, marker: str) -> str | None:
+    """
+    Same as find_script over a full lxml tree, slower but tolerant to unusual markup.
+    """
+    page = BeautifulSoup(content, "lxml")
+    for script in page.find_all("script"):
+        text = script.get_text()
+        if marker in text:
+            return text
+    return None
+
+
+def get_script_json(content: bytes | str, marker: str):
+    script = find_script(content=content, marker=marker)
+    if script is not None:
+        try:
+            return chompjs.parse_js_object(script)
+        except ValueError:
+            pass
+
+    script = find_script_in_tree(content=content, marker=marker)
+    return chompjs.parse_js_object(script) if script is not None else None
+
+
+def parse_catalog_page(content: bytes) -> dict | None:
+    data = get_script_json(content=content, marker=CATALOG_MARKER)
+    return {"categoryInfo": data["categoryInfo"]} if data else None
+
+
+def parse_product_page(content: bytes) -> dict | None:
+    """
+    Extracts and normalises product fields from a product page. Returns a small dict,
+    so it is cheap to send back from a worker process.
+    """
+    data = get_script_json(content=content, marker=PRODUCT_MARKER)
+    if not data:
+        return None
+
+    description = data["description"].replace(" ", "") if data["description"] else None
+
+    try:
+        characteristics = str(data["specifications"])
+        specifications = chompjs.parse_js_object(characteristics) if characteristics else None
+        characteristics = json.dumps(specifications) if specifications is not None else None
+    except Exception as e:
+        specifications, characteristics = None, None
+
+    return {
+        "src_id": data["card"]["id"],
+        "name": data["card"]["title"],
+        "rating": data["card"]["rating"],
+        "image": data["galleryImages"][0]["medium"],
+        "description": description,
+        "characteristics": characteristics,
+        "facets": json.dumps(make_facets(specifications), ensure_ascii=False)
+    }
+
+
+def make_facets(specifications) -> dict:
+    """
+    Flattens characteristic groups into {feature code: {"name": ..., "values": [...]}} with
+    trimmed, whitespace collapsed and deduplicated values, the shape filtered with @>.
+    """
+    facets = dict()
+    if not isinstance(specifications, list):
+        return facets
+
+    for group in specifications:
+        for feature in (group.get("features") or []) if isinstance(group, dict) else []:
+            code = feature.get("code")
+            if not code:
+                continue
+
+            facet = facets.setdefault(code, {"name": feature.get("name"), "values": []})
+            for item in feature.get("featureValues") or []:
+                value = " ".join(str(item.get("value") or "").split())
+                if value and value not in facet["values"]:
+                    facet["values"].append(value)
+
+    return {code: facet for code, facet in facets.items() if facet["values"]}
@@ -0,0 +1,112 @@
+import datetime
+from logging import Logger
+
+from .database import Database
+
+
+class CrawlFrontier:
+    """
+    Crawl progress persisted in Postgres. Items are added as pending before they are
+    scheduled and marked completed only after their data is uploaded. Completion belongs
+    to a crawl generation: a new crawl starts from a clean frontier, a restarted one resumes
+    its unfinished generation and skips items done in it. A category with sub-categories is
+    completed once its whole subtree is.
+    """
+
+    def __init__(self, config: dict, logger: Logger, db: Database):
+        self._config = config.get("frontier", {})
+        self._distributed = config.get("distributed", {})
+        self._logger = logger
+        self._db = db
+        self._generation = None
+
+    @property
+    def window(self) -> datetime.timedelta:
+        return datetime.timedelta(hours=self._config.get("resume_window_hours", 48))
+
+    @property
+    def lease(self) -> datetime.timedelta:
+        return datetime.timedelta(minutes=self._distributed.get("lease_minutes", 30))
+
+    @property
+    def generation(self) -> int | None:
+        return self._generation
+
+    async def start(self) -> bool:
+        """
+        Joins the unfinished generation started within the resume window or starts a new
+        one, returns whether a generation was resumed.
+        """
+        self._generation, resumed = await self._db.start_crawl_generation(resume_window=self.window)
+        self._logger.info(f"{'Resuming' if resumed else 'Starting'} crawl generation {self._generation}")
+        return resumed
+
+    async def finish(self, key: str) -> bool:
+        """
+        Closes the generation once the root item is completed.
+        """
+        if not await self.get_completed(keys=[key]):
+            return False
+
+        await self._db.finish_crawl_generation(generation=self._generation)
+        return True
+
+    @staticmethod
+    def category_key(link: str) -> str:
+        return f"category:{link}"
+
+    @staticmethod
+    def page_key(code: str, page: int) -> str:
+        return f"page:{code}:{page}"
+
+    async def get_pending(self, kind: str) -> list:
+        rows = await self._db.get_frontier(kind=kind, status="pending", generation=self._generation)
+        return [row[1] for row in rows]
+
+    async def add(self, kind: str, items: list, parent_key: str | None = None):
+        """
+        items are (key, payload) pairs. Items already added in this generation are left as they are.
+        """
+        await self._db.add_frontier(kind=kind, items=items, generation=self._generation, parent_key=parent_key)
+
+    async def expand(self, key: str):
+        await self._db.expand_frontier(key=key, generation=self._generation)
+
+    async def lease(self, node: str, limit: int) -> list:
+        """
+        Claims up to limit pending categories not leased by another live node.
+        """
+        rows = await self._db.lease_frontier(
+            kind="category",
+            node=node,
+            limit=limit,
+            lease=self.lease,
+            generation=self._generation
+        )
+        return [row[1] for row in rows]
+
+    async def renew(self, node: str, keys: list):
+        """
+        Extends leases of items this node is still crawling.
+        """
+        if keys:
+            await self._db.renew_frontier(keys=keys, node=node, lease=self.lease)
+
+    async def has_pending(self) -> bool:
+        return await self._db.has_pending_frontier(generation=self._generation)
+
+    async def get_completed(self, keys: list) -> set:
+        rows = await self._db.get_completed_frontier(keys=keys, generation=self._generation)
+        return {row[0] for row in rows}
+
+    async def fail(self, key: str):
+        status = await self._db.fail_frontier(
+            key=key,
+            max_attempts=self._config.get("max_attempts", 3),
+            generation=self._generation
+        )
+        if status == "failed":
+            self._logger.warning(f"Frontier item {key} failed {self._config.get('max_attempts', 3)} times, skipping it")
+
+    async def flush(self, keys: list):
+        await self._db.complete_frontier(keys=keys, generation=self._generation)
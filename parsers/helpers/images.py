@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import os
+import traceback
+import uuid
+from concurrent.futures import Executor
+from logging import Logger
+from urllib.parse import urlsplit
+
+import aiofiles
+import aiohttp
+
+from models.Image import Image as ImageModel
+from .database import Database
+from .scheduler import HostThrottle
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def make_thumbnail(source: str, target: str, size: tuple):
+    with Image.open(source) as image:
+        image.thumbnail(size)
+        image.save(target)
+
+
+class ImageStore:
+    """
+    Content addressed image storage. Files are stored under their sha256, a url -> path
+    index skips downloads of known urls and identical images downloaded from different
+    urls share one file. Downloads run in background with bounded concurrency, products
+    get their image path when the index is flushed.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, config: dict, logger: Logger, db: Database, session: aiohttp.ClientSession,
+                 throttle: HostThrottle, executor: Executor = None):
+        self._config = config
+        self._images_config = config.get("images", {})
+        self._logger = logger
+        self._db = db
+        self._session = session
+        self._throttle = throttle
+        self._executor = executor
+        self._semaphore = asyncio.Semaphore(self._images_config.get("concurrency", 8))
+        self._index = dict()
+        self._pending = dict()
+        self._tasks = set()
+        self._downloaded = list()
+        self._assigned = list()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._downloaded or self._assigned)
+
+    async def load(self):
+        self._index = await self._db.get_images_as_dict()
+
+    def path(self, url: str) -> str | None:
+        return self._index.get(url)
+
+    def get(self, url: str, product_id: str) -> str | None:
+        """
+        Returns stored path for url when it is already known, otherwise schedules
+        the download and assigns the path to the product once it is done.
+        """
+        path = self._index.get(url)
+        if path:
+            return path
+
+        self._pending.setdefault(url, set()).add(product_id)
+        if len(self._pending[url]) == 1:
+            task = asyncio.create_task(self._download(url=url))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return None
+
+    async def join(self):
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def flush(self):
+        downloaded, assigned = self._downloaded.copy(), self._assigned.copy()
+        self._downloaded.clear()
+        self._assigned.clear()
+
+        await self._db.insert(
+            table=ImageModel.TABLE,
+            columns=ImageModel.COLUMNS,
+            data=downloaded,
+            on_conflict=ImageModel.ON_CONFLICT,
+            unique=ImageModel.UNIQUE
+        )
+        # products not written yet get their path from the index when they are uploaded
+        await self._db.update_product_images(data=assigned)
+
+    async def _download(self, url: str):
+        try:
+            async with self._semaphore:
+                hash, extension = await self._fetch(url=url)
+
+            filename = f"{hash}{extension}"
+            path = str(os.path.join(self._config["files"], hash[:2], filename))
+            self._index[url] = path
+            self._downloaded.append((url, hash, path))
+            for product_id in self._pending.pop(url, set()):
+                self._assigned.append((product_id, path))
+
+            if self._images_config.get("thumbnails", {}).get("enabled", False) and Image is not None:
+                await self._make_thumbnail(hash=hash, filename=filename)
+        except Exception as e:
+            self._pending.pop(url, None)
+            self._logger.error(f"Failed to save image {url}: {e}\n{traceback.format_exc()}")
+
+    async def _fetch(self, url: str) -> tuple:
+        directory = str(os.path.join(self._config["base_dir"], self._config["files"]))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f".{uuid.uuid4()}.part")
+        extension = os.path.splitext(urlsplit(url).path)[1]
+        digest = hashlib.sha256()
+
+        try:
+            async with self._throttle.slot(url), self._session.get(url=url) as response:
+                if response.status != 200:
+                    raise Exception(f"Incorrect response status {response.status}")
+
+                async with aiofiles.open(temp_path, 'wb') as file:
+                    async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                        digest.update(chunk)
+                        await file.write(chunk)
+
+            hash = digest.hexdigest()
+            file_path = os.path.join(directory, hash[:2], f"{hash}{extension}")
+            if os.path.exists(file_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                os.replace(temp_path, file_path)
+            return hash, extension
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    async def _make_thumbnail(self, hash: str, filename: str):
+        thumbnails = self._images_config["thumbnails"]
+        directory = str(os.path.join(self._config["base_dir"], self._config["files"]))
+        source = os.path.join(directory, hash[:2], filename)
+        target = os.path.join(directory, "thumbnails", hash[:2], filename)
+        if os.path.exists(target):
+            return
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        size = tuple(thumbnails.get("size", [256, 256]))
+        await asyncio.get_running_loop().run_in_executor(self._executor, make_thumbnail, source, target, size)
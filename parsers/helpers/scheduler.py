@@ -0,0 +1,223 @@
+import asyncio
+import time
+import traceback
+from logging import Logger
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float):
+        self._refill(time.monotonic())
+        self._rate = rate
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now: float):
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class HostThrottle:
+    """
+    Per-host politeness budget: bounded number of in-flight requests and a token bucket
+    limiting request rate. Hosts missing in config use the "default" entry. The rate
+    adapts to errors: halved on every failed or throttled request down to min_rate,
+    restored by rate_step per successful one.
+    """
+
+    def __init__(self, config: dict):
+        self._config = config.get("crawler", {}).get("hosts", {})
+        self._hosts = dict()
+
+    def _get(self, host: str) -> tuple:
+        if host not in self._hosts:
+            host_config = self._config.get(host, self._config.get("default", {}))
+            self._hosts[host] = (
+                asyncio.Semaphore(host_config.get("concurrency", 4)),
+                TokenBucket(rate=host_config.get("rate", 5), capacity=host_config.get("burst", 5)),
+                host_config
+            )
+        return self._hosts[host]
+
+    def slot(self, url: str):
+        semaphore, bucket, _ = self._get(urlsplit(url).hostname or "")
+        return _HostSlot(semaphore, bucket)
+
+    def record(self, url: str, success: bool, retry_after: float = None):
+        _, bucket, host_config = self._get(urlsplit(url).hostname or "")
+        rate = host_config.get("rate", 5)
+        if success:
+            if bucket.rate < rate:
+                bucket.set_rate(min(rate, bucket.rate + host_config.get("rate_step", 0.1)))
+        else:
+            bucket.set_rate(max(host_config.get("min_rate", 0.5), bucket.rate / 2))
+
+        if retry_after:
+            bucket.pause(retry_after)
+
+    def get_rates(self) -> dict:
+        return {host: round(bucket.rate, 2) for host, (_, bucket, _) in self._hosts.items()}
+
+
+class _HostSlot:
+    def __init__(self, semaphore: asyncio.Semaphore, bucket: TokenBucket):
+        self._semaphore = semaphore
+        self._bucket = bucket
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            await self._bucket.acquire()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def __aexit__(self, *args):
+        self._semaphore.release()
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit for {endpoint} is open")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker, endpoint being host and first two path segments. After
+    failure_threshold consecutive failures requests fail fast for reset_timeout, then
+    a single probe either closes the circuit or reopens it for twice as long.
+    """
+
+    def __init__(self, config: dict, logger: Logger):
+        self._config = config.get("crawler", {}).get("breaker", {})
+        self._logger = logger
+        self._endpoints = dict()
+
+    @staticmethod
+    def endpoint(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.hostname}/{'/'.join(parts.path.strip('/').split('/')[:2])}"
+
+    def check(self, url: str):
+        """
+        Raises CircuitOpenError while the endpoint is open or another request probes it.
+        """
+        endpoint = self.endpoint(url)
+        state = self._endpoints.get(endpoint)
+        if state is None or state["opened_until"] is None:
+            return
+
+        now = time.monotonic()
+        blocked_until = max(state["opened_until"], state["probe_until"])
+        if now < blocked_until:
+            raise CircuitOpenError(endpoint=endpoint, retry_in=blocked_until - now)
+
+        # a probe lost to cancellation is given up after the reset timeout
+        state["probe_until"] = now + self._config.get("reset_timeout", 30)
+        state["probing"] = True
+
+    def record(self, url: str, success: bool):
+        endpoint = self.endpoint(url)
+        reset_timeout = self._config.get("reset_timeout", 30)
+        state = self._endpoints.setdefault(endpoint, {
+            "failures": 0, "opened_until": None, "probe_until": 0.0, "probing": False, "timeout": reset_timeout
+        })
+
+        if success:
+            if state["opened_until"] is not None:
+                self._logger.info(f"Circuit for {endpoint} is closed")
+            state.update(failures=0, opened_until=None, probe_until=0.0, probing=False, timeout=reset_timeout)
+            return
+
+        state["failures"] += 1
+        if state["probing"]:
+            state["timeout"] = min(state["timeout"] * 2, self._config.get("max_timeout", 600))
+        elif state["opened_until"] is not None or state["failures"] < self._config.get("failure_threshold", 10):
+            return
+
+        state.update(opened_until=time.monotonic() + state["timeout"], probe_until=0.0, probing=False)
+        self._logger.warning(f"Circuit for {endpoint} is open for {state['timeout']}s after {state['failures']} failures")
+
+
+class CrawlScheduler:
+    """
+    Work queue drained by a fixed number of async workers. Work items are coroutines,
+    they may submit further items while running. run() returns once the queue is drained.
+    """
+
+    def __init__(self, config: dict, logger: Logger):
+        self._workers = config.get("crawler", {}).get("workers", 4)
+        self._logger = logger
+        self._queue = asyncio.Queue()
+        self._tasks = list()
+        self._unfinished = 0
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def unfinished(self) -> int:
+        return self._unfinished
+
+    def submit(self, coro):
+        self._unfinished += 1
+        self._queue.put_nowait(coro)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = list()
+
+    async def run(self):
+        self.start()
+        try:
+            await self._queue.join()
+        finally:
+            await self.stop()
+
+    async def _worker(self):
+        while True:
+            coro = await self._queue.get()
+            try:
+                await coro
+            except Exception as e:
+                self._logger.error(f"Crawl task failed: {e}\n{traceback.format_exc()}")
+            finally:
+                self._unfinished -= 1
+                self._queue.task_done()
@@ -0,0 +1,161 @@
+import asyncio
+import time
+import traceback
+from logging import Logger
+
+from models import Category, Product
+from models.PriceHistory import PriceHistory
+from models.ProductFingerprint import ProductFingerprint
+from models.ProductCategory import ProductCategory
+from models.Supplier import Supplier
+from .database import Database
+from .frontier import CrawlFrontier
+from .images import ImageStore
+
+
+class DatabaseWriter:
+    """
+    Single consumer of parsed records. Fetch tasks put records into a bounded queue and
+    wait while it is full, the writer collects them into batches and uploads a batch when
+    it reaches batch_size or flush_interval passes, so fetching and writing overlap and
+    memory is bounded by the queue plus one batch. Frontier completions travel through
+    the same queue and are flushed after the records queued before them.
+    """
+
+    def __init__(self, config: dict, logger: Logger, db: Database, frontier: CrawlFrontier, images: ImageStore):
+        self._config = config.get("writer", {})
+        self._logger = logger
+        self._db = db
+        self._frontier = frontier
+        self._images = images
+        self._queue = asyncio.Queue(maxsize=self._config.get("queue_size", 10000))
+        self._task = None
+        self._categories = list()
+        self._products = list()
+        self._suppliers = list()
+        self._memberships = list()
+        self._fingerprints = list()
+        self._completed = list()
+        self._bumped_at = time.monotonic()
+
+    async def put(self, record: Category | Product | Supplier | ProductCategory | ProductFingerprint):
+        await self._queue.put(record)
+
+    async def complete(self, key: str):
+        await self._queue.put(key)
+
+    async def flush(self):
+        """
+        Waits until everything queued so far is written.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(future)
+        await future
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        flush_interval = self._config.get("flush_interval", 30)
+        batch_size = self._config.get("batch_size", 5000)
+        uploaded_at = time.monotonic()
+
+        while True:
+            try:
+                timeout = max(0.0, uploaded_at + flush_interval - time.monotonic())
+                record = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                record = False
+
+            if record is None:
+                await self._upload()
+                return
+
+            if isinstance(record, asyncio.Future):
+                await self._upload()
+                record.set_result(None)
+                uploaded_at = time.monotonic()
+                continue
+
+            if isinstance(record, Product):
+                self._products.append(record)
+            elif isinstance(record, Supplier):
+                self._suppliers.append(record)
+            elif isinstance(record, ProductCategory):
+                self._memberships.append(record)
+            elif isinstance(record, ProductFingerprint):
+                self._fingerprints.append(record)
+            elif isinstance(record, Category):
+                self._categories.append(record)
+            elif isinstance(record, str):
+                self._completed.append(record)
+
+            if len(self._products) + len(self._suppliers) >= batch_size or time.monotonic() - uploaded_at >= flush_interval:
+                await self._upload()
+                uploaded_at = time.monotonic()
+
+    async def _upload(self):
+        categories, products, suppliers = self._categories, self._products, self._suppliers
+        memberships, fingerprints, completed = self._memberships, self._fingerprints, self._completed
+        self._categories, self._products, self._suppliers = list(), list(), list()
+        self._memberships, self._fingerprints, self._completed = list(), list(), list()
+
+        if not (categories or products or suppliers or memberships or fingerprints or completed or self._images.dirty):
+            return
+
+        try:
+            await self._db.insert(
+                table=Category.TABLE,
+                columns=Category.COLUMNS,
+                data=[c.row() for c in categories],
+                on_conflict=Category.ON_CONFLICT
+            )
+
+            for product in products:
+                if not product.image:
+                    product.image = self._images.path(product.image_url)
+
+            await self._db.insert(
+                table=Product.TABLE,
+                columns=Product.COLUMNS,
+                data=[c.row() for c in products],
+                on_conflict=Product.ON_CONFLICT,
+                unique=Product.UNIQUE
+            )
+
+            await self._db.update_product_fingerprints(data=[c.row() for c in fingerprints])
+
+            await self._db.insert_product_categories(data=[c.row() for c in memberships])
+
+            await self._db.insert_price_changes(data=[c.row(PriceHistory.COLUMNS) for c in suppliers])
+
+            supplier_columns = Supplier.COLUMNS.copy()
+            supplier_columns.remove("id")
+
+            await self._db.insert(
+                table=Supplier.TABLE,
+                columns=supplier_columns,
+                data=[c.row(supplier_columns) for c in suppliers],
+                on_conflict=Supplier.ON_CONFLICT,
+                unique=Supplier.UNIQUE
+            )
+
+            await self._images.flush()
+            await self._db.refresh_price_summary(product_ids=list({s.product_id for s in suppliers}))
+            # the crawl bumps the version once at the end, long crawls also bump every version_bump_interval
+            # so api caches pick up fresh data without being flushed on every batch
+            if time.monotonic() - self._bumped_at >= self._config.get("version_bump_interval", 600):
+                await self._db.bump_catalogue_version()
+                self._bumped_at = time.monotonic()
+            await self._frontier.flush(keys=completed)
+        except Exception as e:
+            # completions of the lost batch are not flushed, their items are crawled again on the next run
+            self._logger.error(f"Failed to upload batch: {e}\n{traceback.format_exc()}")
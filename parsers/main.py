@@ -41,16 +41,19 @@ async def main():
     kaspi_parser = KaspiParser(config=config, logger=logger, db=db)
 
     try:
+        await db.create_pool()
+        await db.migrate()
+        await db.ensure_price_history_partitions()
         logger.info(f"Parser started")
         await kaspi_parser.parse()
     except Exception as err:
         logger.fatal(f"Parser failed with error {err}\nTRACEBACK: {traceback.format_exc()}")
     finally:
-        await close_connections()
+        await close_connections(db=db)
 
 
-async def close_connections():
-    await asyncio.sleep(0)
+async def close_connections(db: Database):
+    await db.close_pool()
 
 
 if __name__ == '__main__':
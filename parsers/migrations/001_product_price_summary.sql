@@ -0,0 +1,32 @@
+-- Per-product price summary, kept in sync with suppliers by the parser on every upload.
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS min_price float8,
+    ADD COLUMN IF NOT EXISTS max_price float8,
+    ADD COLUMN IF NOT EXISTS avg_price float8,
+    ADD COLUMN IF NOT EXISTS offers integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS best_merchant_rating float8;
+
+UPDATE products p
+SET
+    min_price = s.min_price,
+    max_price = s.max_price,
+    avg_price = s.avg_price,
+    offers = s.offers,
+    best_merchant_rating = s.best_merchant_rating
+FROM (
+    SELECT
+        product_id,
+        min(price) AS min_price,
+        max(price) AS max_price,
+        avg(price) AS avg_price,
+        count(*) AS offers,
+        max(rating) AS best_merchant_rating
+    FROM suppliers
+    GROUP BY product_id
+) s
+WHERE p.id = s.product_id;
+
+CREATE INDEX IF NOT EXISTS products_max_price_idx ON products (max_price, id) WHERE offers > 0;
+CREATE INDEX IF NOT EXISTS products_relevance_idx ON products (relevance DESC, id DESC) WHERE offers > 0;
+CREATE INDEX IF NOT EXISTS products_rating_idx ON products (rating DESC, id DESC) WHERE offers > 0;
+CREATE INDEX IF NOT EXISTS products_category_id_idx ON products (category_id text_pattern_ops);
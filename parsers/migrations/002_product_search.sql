@@ -0,0 +1,11 @@
+-- Full-text and trigram indexes for product search.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS products_search_vector_idx ON products USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS products_name_trgm_idx ON products USING gin (name gin_trgm_ops);
@@ -0,0 +1,8 @@
+-- Single-row marker bumped by the parser after every upload, used by the backend to invalidate caches.
+CREATE TABLE IF NOT EXISTS catalogue_version (
+    id integer PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version bigint NOT NULL DEFAULT 0,
+    updated_at timestamp NOT NULL DEFAULT now()
+);
+
+INSERT INTO catalogue_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING;
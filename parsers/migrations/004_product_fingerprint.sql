@@ -0,0 +1,7 @@
+-- Change detection for incremental crawls: listing card fingerprint and HTTP validators of the product page.
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS fingerprint text,
+    ADD COLUMN IF NOT EXISTS etag text,
+    ADD COLUMN IF NOT EXISTS last_modified text;
+
+CREATE INDEX IF NOT EXISTS products_src_id_idx ON products (src_id);
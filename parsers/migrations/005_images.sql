@@ -0,0 +1,9 @@
+-- Content addressed image store index: source url -> sha256 of the body and stored path.
+CREATE TABLE IF NOT EXISTS images (
+    url text PRIMARY KEY,
+    hash text NOT NULL,
+    path text NOT NULL,
+    created_at timestamp NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS images_hash_idx ON images (hash);
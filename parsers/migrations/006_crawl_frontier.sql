@@ -0,0 +1,11 @@
+-- Persistent crawl frontier: categories and listing pages with their progress, used to resume crawls.
+CREATE TABLE IF NOT EXISTS crawl_frontier (
+    key text PRIMARY KEY,
+    kind text NOT NULL,
+    payload jsonb NOT NULL DEFAULT '{}',
+    status text NOT NULL DEFAULT 'pending',
+    updated_at timestamp NOT NULL DEFAULT now(),
+    completed_at timestamp
+);
+
+CREATE INDEX IF NOT EXISTS crawl_frontier_status_idx ON crawl_frontier (status, kind);
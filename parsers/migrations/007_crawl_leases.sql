@@ -0,0 +1,6 @@
+-- Leases on frontier items so several parser processes can share one crawl.
+ALTER TABLE crawl_frontier
+    ADD COLUMN IF NOT EXISTS leased_by text,
+    ADD COLUMN IF NOT EXISTS lease_until timestamp;
+
+CREATE INDEX IF NOT EXISTS crawl_frontier_pending_idx ON crawl_frontier (kind, updated_at) WHERE status = 'pending';
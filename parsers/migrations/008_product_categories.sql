@@ -0,0 +1,12 @@
+-- Category membership of products: a product listed in several leaf categories is stored once
+-- with its first category in products.category_id, every listing category is recorded here.
+CREATE TABLE IF NOT EXISTS product_categories AS
+SELECT DISTINCT id AS product_id, category_id FROM products WHERE category_id IS NOT NULL;
+
+ALTER TABLE product_categories
+    ALTER COLUMN product_id SET NOT NULL,
+    ALTER COLUMN category_id SET NOT NULL,
+    ADD PRIMARY KEY (product_id, category_id),
+    ADD FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE;
+
+CREATE INDEX IF NOT EXISTS product_categories_category_id_idx ON product_categories (category_id, product_id);
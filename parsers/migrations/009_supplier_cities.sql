@@ -0,0 +1,28 @@
+-- Offers are crawled per city: suppliers are keyed by product, city and merchant.
+ALTER TABLE suppliers ADD COLUMN IF NOT EXISTS city_id text NOT NULL DEFAULT '750000000';
+
+-- the previous (product_id, name) key may be a constraint or a plain unique index
+DO $$
+DECLARE
+    item record;
+BEGIN
+    FOR item IN
+        SELECT i.indexrelid::regclass AS index_name, c.conname
+        FROM pg_index i
+        LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid AND c.conrelid = i.indrelid
+        WHERE i.indrelid = 'suppliers'::regclass AND i.indisunique AND NOT i.indisprimary
+          AND (
+              SELECT array_agg(a.attname::text ORDER BY a.attname)
+              FROM pg_attribute a
+              WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+          ) = ARRAY['name', 'product_id']
+    LOOP
+        IF item.conname IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE suppliers DROP CONSTRAINT %I', item.conname);
+        ELSE
+            EXECUTE format('DROP INDEX %s', item.index_name);
+        END IF;
+    END LOOP;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS suppliers_product_city_name_idx ON suppliers (product_id, city_id, name);
@@ -0,0 +1,44 @@
+-- Append-only price observations: the parser adds a row only when an offer price changes.
+-- Range partitioned by month, BRIN on time for window scans, btree for per-product series.
+DO $$
+BEGIN
+    IF to_regclass('price_history') IS NULL THEN
+        EXECUTE format('
+            CREATE TABLE price_history (
+                product_id %s NOT NULL,
+                city_id text NOT NULL,
+                name text NOT NULL,
+                price float8 NOT NULL,
+                observed_at timestamp NOT NULL DEFAULT now()
+            ) PARTITION BY RANGE (observed_at)',
+            (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+             WHERE attrelid = 'products'::regclass AND attname = 'id')
+        );
+    END IF;
+END $$;
+
+-- rows outside of created partitions land here instead of failing the upload
+CREATE TABLE IF NOT EXISTS price_history_default PARTITION OF price_history DEFAULT;
+
+CREATE INDEX IF NOT EXISTS price_history_observed_at_idx ON price_history USING brin (observed_at);
+CREATE INDEX IF NOT EXISTS price_history_product_idx ON price_history (product_id, observed_at);
+
+CREATE OR REPLACE FUNCTION ensure_price_history_partition(target timestamp) RETURNS void AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', target);
+    partition_name text := format('price_history_%s', to_char(month_start, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF price_history FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, month_start + interval '1 month'
+        );
+    END IF;
+END $$ LANGUAGE plpgsql;
+
+SELECT ensure_price_history_partition(now()::timestamp);
+SELECT ensure_price_history_partition((now() + interval '1 month')::timestamp);
+
+-- current offers are the first observation
+INSERT INTO price_history (product_id, city_id, name, price)
+SELECT product_id, city_id, name, price FROM suppliers WHERE price IS NOT NULL;
@@ -0,0 +1,44 @@
+-- Characteristics as jsonb plus facets normalised by the parser: {feature code: {"name": ..., "values": [...]}}.
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'products' AND column_name = 'characteristics') IN ('text', 'character varying') THEN
+        ALTER TABLE products ALTER COLUMN characteristics TYPE jsonb USING NULLIF(characteristics, '')::jsonb;
+    END IF;
+END $$;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS facets jsonb NOT NULL DEFAULT '{}';
+
+-- same normalisation as helpers.extract.make_facets, products skipped by incremental crawls keep their facets
+UPDATE products p
+SET facets = f.facets
+FROM (
+    SELECT id, jsonb_object_agg(code, jsonb_build_object('name', name, 'values', "values")) AS facets
+    FROM (
+        SELECT
+            p.id,
+            feature->>'code' AS code,
+            min(feature->>'name') AS name,
+            jsonb_agg(DISTINCT regexp_replace(btrim(value->>'value'), '\s+', ' ', 'g')) AS "values"
+        FROM products p
+        CROSS JOIN LATERAL jsonb_array_elements(CASE WHEN jsonb_typeof(p.characteristics) = 'array' THEN p.characteristics ELSE '[]' END) AS grp
+        CROSS JOIN LATERAL jsonb_array_elements(COALESCE(grp->'features', '[]')) AS feature
+        CROSS JOIN LATERAL jsonb_array_elements(COALESCE(feature->'featureValues', '[]')) AS value
+        WHERE feature->>'code' IS NOT NULL AND btrim(value->>'value') <> ''
+        GROUP BY p.id, feature->>'code'
+    ) features
+    GROUP BY id
+) f
+WHERE p.id = f.id;
+
+CREATE INDEX IF NOT EXISTS products_facets_idx ON products USING gin (facets jsonb_path_ops);
+
+-- facet value counts per category including sub categories, rebuilt by the parser after each crawl
+CREATE TABLE IF NOT EXISTS category_facets (
+    category_id text NOT NULL,
+    code text NOT NULL,
+    name text,
+    value text NOT NULL,
+    products integer NOT NULL,
+    PRIMARY KEY (category_id, code, value)
+);
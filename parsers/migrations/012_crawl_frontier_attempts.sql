@@ -0,0 +1,3 @@
+-- Failed attempts per frontier item, an item failing max_attempts times is marked 'failed'
+-- and left alone until the refresh window passes.
+ALTER TABLE crawl_frontier ADD COLUMN IF NOT EXISTS attempts integer NOT NULL DEFAULT 0;
@@ -0,0 +1,12 @@
+-- Keyset pagination compares (sort key, id) row values, which never match a NULL key,
+-- so the listing sort columns are kept NOT NULL. Only priced offers are counted, every
+-- listed product (offers > 0) therefore has a max_price.
+UPDATE products SET rating = 0 WHERE rating IS NULL;
+UPDATE products SET relevance = now() WHERE relevance IS NULL;
+UPDATE products SET offers = 0 WHERE offers > 0 AND max_price IS NULL;
+
+ALTER TABLE products
+    ALTER COLUMN rating SET DEFAULT 0,
+    ALTER COLUMN rating SET NOT NULL,
+    ALTER COLUMN relevance SET DEFAULT now(),
+    ALTER COLUMN relevance SET NOT NULL;
@@ -0,0 +1,15 @@
+-- Crawl generations: completion is recorded per generation, so a new crawl starts from a
+-- clean frontier and a restarted one only skips items done in its own generation.
+-- parent_key links categories to the category that expanded them, a category is done
+-- once its whole subtree is.
+CREATE TABLE IF NOT EXISTS crawl_generations (
+    id serial PRIMARY KEY,
+    started_at timestamp NOT NULL DEFAULT now(),
+    finished_at timestamp
+);
+
+ALTER TABLE crawl_frontier
+    ADD COLUMN IF NOT EXISTS generation integer,
+    ADD COLUMN IF NOT EXISTS parent_key text;
+
+CREATE INDEX IF NOT EXISTS crawl_frontier_parent_key_idx ON crawl_frontier (parent_key, generation);
@@ -0,0 +1,3 @@
+-- Category filters match a category and its subtree by id prefix through product_categories.
+CREATE INDEX IF NOT EXISTS product_categories_category_prefix_idx
+    ON product_categories (category_id text_pattern_ops, product_id);
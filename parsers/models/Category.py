@@ -1,8 +1,13 @@
-class Category:
+from .Model import Model
+
+
+class Category(Model):
     TABLE = 'categories'
     COLUMNS = ["id", "parent_id", "code", "name"]
     ON_CONFLICT = f"ON CONFLICT DO NOTHING"
 
+    __slots__ = COLUMNS
+
     def __init__(
             self,
             id: str,
@@ -0,0 +1,15 @@
+from .Model import Model
+
+
+class Image(Model):
+    TABLE = 'images'
+    COLUMNS = ["url", "hash", "path"]
+    UNIQUE = ["url"]
+    ON_CONFLICT = f"ON CONFLICT (url) DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in COLUMNS)}"
+
+    __slots__ = COLUMNS
+
+    def __init__(self, url: str, hash: str, path: str):
+        self.url = url
+        self.hash = hash
+        self.path = path
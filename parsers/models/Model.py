@@ -0,0 +1,10 @@
+class Model:
+    """
+    Base of the slotted records the parser uploads, COLUMNS lists fields in table column order.
+    """
+    COLUMNS = []
+
+    __slots__ = ()
+
+    def row(self, columns: list = None) -> tuple:
+        return tuple(getattr(self, column) for column in columns or self.COLUMNS)
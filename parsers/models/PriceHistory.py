@@ -0,0 +1,15 @@
+from .Model import Model
+
+
+class PriceHistory(Model):
+    TABLE = 'price_history'
+    COLUMNS = ["product_id", "city_id", "name", "price"]
+    UNIQUE = ["product_id", "city_id", "name"]
+
+    __slots__ = COLUMNS
+
+    def __init__(self, product_id: str, city_id: str, name: str, price: float):
+        self.product_id = product_id
+        self.city_id = city_id
+        self.name = name
+        self.price = price
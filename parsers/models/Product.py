@@ -1,13 +1,21 @@
 import datetime
 
+from .Model import Model
 
-class Product:
+
+class Product(Model):
     TABLE = 'products'
-    COLUMNS = ["id", "src_id", "category_id", "name", "image", "rating", "description", "characteristics", "relevance"]
-    ON_CONFLICT = f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in COLUMNS)}"
+    COLUMNS = ["id", "src_id", "category_id", "name", "image", "rating", "description", "characteristics", "relevance",
+               "fingerprint", "etag", "last_modified", "facets"]
+    UNIQUE = ["id"]
+    ON_CONFLICT = f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = EXCLUDED.{c}' for c in COLUMNS if c != 'image')}, " \
+                  f"image = COALESCE(EXCLUDED.image, {TABLE}.image)"
+
+    __slots__ = COLUMNS + ["image_url"]
 
     def __init__(self, id: str or None, src_id: str, category_id: str, name: str, image: str, rating: float, description: str,
-                 characteristics: str):
+                 characteristics: str, fingerprint: str = None, etag: str = None, last_modified: str = None,
+                 image_url: str = None, facets: str = "{}"):
         self.id = id
         self.src_id = src_id
         self.category_id = category_id
@@ -17,3 +25,8 @@ class Product:
         self.description = description
         self.characteristics = characteristics
         self.relevance = datetime.datetime.now()
+        self.fingerprint = fingerprint
+        self.etag = etag
+        self.last_modified = last_modified
+        self.image_url = image_url
+        self.facets = facets
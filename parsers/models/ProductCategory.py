@@ -0,0 +1,14 @@
+from .Model import Model
+
+
+class ProductCategory(Model):
+    TABLE = 'product_categories'
+    COLUMNS = ["product_id", "category_id"]
+    UNIQUE = ["product_id", "category_id"]
+    ON_CONFLICT = f"ON CONFLICT (product_id, category_id) DO NOTHING"
+
+    __slots__ = COLUMNS
+
+    def __init__(self, product_id: str, category_id: str):
+        self.product_id = product_id
+        self.category_id = category_id
@@ -0,0 +1,11 @@
+from .Model import Model
+
+
+class ProductFingerprint(Model):
+    COLUMNS = ["id", "fingerprint"]
+
+    __slots__ = COLUMNS
+
+    def __init__(self, id: str, fingerprint: str):
+        self.id = id
+        self.fingerprint = fingerprint
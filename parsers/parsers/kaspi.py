@@ -1,21 +1,38 @@
 import asyncio
+import datetime
+import email.utils
+import hashlib
 import http
 import json
 import os
+import random
 import re
+import socket
 import traceback
 import uuid
-import chompjs
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 from logging import Logger
 
-import aiofiles
 from fake_useragent import UserAgent
 
 import aiohttp
-from bs4 import BeautifulSoup
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 from helpers import Database
+from helpers.frontier import CrawlFrontier
+from helpers.extract import parse_catalog_page, parse_product_page
+from helpers.images import ImageStore
+from helpers.scheduler import CircuitBreaker, CircuitOpenError, CrawlScheduler, HostThrottle
+from helpers.writer import DatabaseWriter
 from models import Category, Product
+from models.ProductCategory import ProductCategory
+from models.ProductFingerprint import ProductFingerprint
 from models.Supplier import Supplier
 
 
@@ -23,54 +40,217 @@ class KaspiParser:
     DOMAIN = "https://kaspi.kz/shop"
     HEADERS = {"User-Agent": UserAgent().random}
     SESSION = aiohttp.ClientSession(trust_env=True)
-    PRODUCTS = list()
-    CATEGORIES = list()
-    SUPPLIERS = list()
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    ROOT = {"id": "", "link": "c/categories/"}
 
     def __init__(self, config: dict, logger: Logger, db: Database):
         self._categories = dict()
+        self._product_ids = OrderedDict()
+        self._seen = dict()
+        self._in_flight = set()
         self._config = config
         self._logger = logger
         self._db = db
+        self._scheduler = CrawlScheduler(config=config, logger=logger)
+        self._throttle = HostThrottle(config=config)
+        self._breaker = CircuitBreaker(config=config, logger=logger)
+        self._incremental = config.get("incremental", {}).get("enabled", False)
+        self._distributed = config.get("distributed", {}).get("enabled", False)
+        self._stats = {"categories_crawled": 0, "products_fetched": 0, "products_unchanged": 0, "products_failed": 0,
+                       "product_fetches_avoided": 0, "requests_retried": 0, "requests_failed": 0}
+        self._executor = None
+        self._images: ImageStore | None = None
+        self._writer: DatabaseWriter | None = None
+        self._frontier = CrawlFrontier(config=config, logger=logger, db=db)
 
     async def parse(self):
-        category = {"id": "", "link": "c/categories/"}
         self._categories = await self._db.get_categories_as_dict()
-        await self.parse_recursive(category=category)
+        if self._config.get("product_ids", {}).get("preload", False):
+            self._product_ids = OrderedDict(await self._db.get_product_ids_as_dict())
+        processes = self._config.get("parsing", {}).get("processes", 0)
+        if processes > 0:
+            self._executor = ProcessPoolExecutor(max_workers=processes)
+
+        self._images = ImageStore(
+            config=self._config,
+            logger=self._logger,
+            db=self._db,
+            session=self.SESSION,
+            throttle=self._throttle,
+            executor=self._executor
+        )
+        await self._images.load()
+        self._writer = DatabaseWriter(
+            config=self._config,
+            logger=self._logger,
+            db=self._db,
+            frontier=self._frontier,
+            images=self._images
+        )
+
+        await self._frontier.start()
+        self._writer.start()
+        try:
+            if self._distributed:
+                await self.run_distributed()
+            else:
+                await self.schedule_frontier()
+                await self._scheduler.run()
+            await self._images.join()
+            await self._writer.stop()
+            if await self._frontier.finish(key=self._frontier.category_key(self.ROOT["link"])):
+                self._logger.info(f"Crawl generation {self._frontier.generation} finished")
+
+            if self._stats["categories_crawled"] > 0:
+                await self._db.refresh_category_facets()
+                await self._db.bump_catalogue_version()
+            else:
+                self._logger.info("Nothing was crawled, catalogue left as is")
+        finally:
+            await self._writer.stop()
+            if resource is not None:
+                # ru_maxrss is in kilobytes on linux
+                self._stats["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+            self._logger.info(f"Crawl summary: {self._stats}, host rates: {self._throttle.get_rates()}")
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    async def schedule_frontier(self):
+        # the root is offered on every run, a resumed generation already has it
+        await self._frontier.add(kind="category", items=[(self._frontier.category_key(self.ROOT["link"]), self.ROOT)])
+
+        pending = await self._frontier.get_pending(kind="category")
+        self._logger.info(f"Crawling {len(pending)} pending categories")
+        for category in pending:
+            if category.get("code"):
+                await self._writer.put(Category(
+                    id=category["id"],
+                    parent_id=category["parent_id"],
+                    name=category["title"],
+                    code=category["code"]
+                ))
+            self._scheduler.submit(self.parse_recursive(category=category))
+
+    async def run_distributed(self):
+        """
+        Shares the crawl with other parser processes through the frontier table: categories
+        are leased with SKIP LOCKED as local workers free up, and the loop ends once no
+        pending category is left anywhere. Leases of categories still being crawled are
+        renewed in the background, so long categories are not taken over by another node.
+        """
+        distributed = self._config.get("distributed", {})
+        node = distributed.get("node_id") or f"{socket.gethostname()}-{os.getpid()}"
+        self._logger.info(f"Running distributed crawl as node {node}")
+
+        await self._frontier.add(kind="category", items=[(self._frontier.category_key(self.ROOT["link"]), self.ROOT)])
+
+        self._scheduler.start()
+        heartbeat = asyncio.create_task(self.renew_leases(node=node))
+        try:
+            while True:
+                free = self._scheduler.workers - self._scheduler.unfinished
+                categories = await self._frontier.lease(node=node, limit=free) if free > 0 else []
+                for category in categories:
+                    self._scheduler.submit(self.parse_recursive(category=category))
+                if categories:
+                    continue
+
+                if self._scheduler.unfinished == 0:
+                    # completions of this node are written by the writer, others may still be waiting for them
+                    await self._writer.flush()
+                    if not await self._frontier.has_pending():
+                        break
+
+                await asyncio.sleep(distributed.get("poll_interval", 5))
+        finally:
+            heartbeat.cancel()
+            await self._scheduler.stop()
+
+    async def renew_leases(self, node: str):
+        # a completion reaches the writer within flush_interval, well inside the renewed lease
+        interval = self._config.get("distributed", {}).get("heartbeat_seconds", 300)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._frontier.renew(node=node, keys=list(self._in_flight))
+            except Exception as e:
+                self._logger.error(f"Failed to renew leases: {e}")
 
     async def parse_recursive(self, category: dict):
         if not category["link"].startswith("c/"):
             return
 
+        key = self._frontier.category_key(category["link"])
+        if await self._frontier.get_completed(keys=[key]):
+            return
+
+        self._in_flight.add(key)
+        try:
+            await self.parse_category(category=category, key=key)
+        except Exception:
+            await self._frontier.fail(key)
+            raise
+        finally:
+            self._in_flight.discard(key)
+
+    async def parse_category(self, category: dict, key: str):
         url = f"{self.DOMAIN}/{category['link']}"
         content = await self.request(url=url)
-        page = BeautifulSoup(content, "lxml")
-        data = self.get_catalog_json(page=page)
+        data = await self.run_parser(parse_catalog_page, content)
+        self._stats["categories_crawled"] += 1
 
         if not data["categoryInfo"]["subNodes"]:
             self._logger.info(f"Parsing '{data['categoryInfo']['title']}' category products.")
             await self.parse_leaf_category_products(category_id=category["id"], data=data["categoryInfo"])
-            await self.upload()
+            await self._writer.complete(key)
             return
 
+        sub_categories = list()
         for sub_category in data["categoryInfo"]["subNodes"]:
             if sub_category["title"] == "Все товары":
                 continue
 
             id = self._categories.get(sub_category["code"])
-            if not id:
+            if not id and self._distributed:
+                id = await self._db.allocate_category_id(
+                    parent_id=category["id"],
+                    code=sub_category["code"],
+                    name=sub_category["title"]
+                )
+                self._categories[sub_category["code"]] = id
+            elif not id:
                 id = self.find_next_category_id(parent_category_id=category["id"])
                 self._categories[sub_category["code"]] = id
 
-            sub_category["id"] = id
             category_model = Category(
                 id=id,
                 parent_id=category.get("id"),
                 name=sub_category["title"],
                 code=sub_category["code"]
             )
-            self.CATEGORIES.append(category_model)
-            await self.parse_recursive(category=sub_category)
+            await self._writer.put(category_model)
+            if not sub_category["link"].startswith("c/"):
+                continue
+
+            sub_categories.append({
+                "id": id,
+                "parent_id": category.get("id"),
+                "link": sub_category["link"],
+                "code": sub_category["code"],
+                "title": sub_category["title"]
+            })
+
+        await self._frontier.add(
+            kind="category",
+            items=[(self._frontier.category_key(sub_category["link"]), sub_category) for sub_category in sub_categories],
+            parent_key=key
+        )
+        if not self._distributed:
+            for sub_category in sub_categories:
+                self._scheduler.submit(self.parse_recursive(category=sub_category))
+        # completed by the frontier together with the last category of its subtree
+        await self._frontier.expand(key)
 
     def find_next_category_id(self, parent_category_id):
         filtered_categories = list(filter(lambda x: len(x) == len(parent_category_id) + 3, self._categories.values()))
@@ -89,81 +269,220 @@ class KaspiParser:
         return f"{'0' * remainder}{value}"
 
     async def parse_leaf_category_products(self, category_id: str, data: dict):
+        keys = {page: self._frontier.page_key(code=data["code"], page=page) for page in range(1, 11)}
+        completed = await self._frontier.get_completed(keys=list(keys.values()))
+        pages = [page for page, key in keys.items() if key not in completed]
+        await asyncio.gather(*(
+            self.parse_leaf_category_page(category_id=category_id, code=data["code"], page=page) for page in pages
+        ))
+
+    async def parse_leaf_category_page(self, category_id: str, code: str, page: int):
+        # listings are crawled in the first configured city, offers in all of them
+        city = self.get_cities()[0]
         url = "https://kaspi.kz/yml/product-view/pl/results"
         params = {
-            "page": 1,
-            "q": f":category:{data['code']}:availableInZones:Magnum_ZONE1",
+            "page": page,
+            "q": f":category:{code}:availableInZones:{city['zone_id']}",
             "text": "",
             "sort": "relevance",
             "qs": "",
             "ui": "d",
             "i": -1,
-            "c": 750000000
+            "c": city["city_id"]
         }
 
         referer = f"https://kaspi.kz/shop/c/smartphones/?q={params['q'].replace(':', '%3A').replace(' ', '')}&sort={params['sort']}&sc="
         headers = {"User-Agent": self.HEADERS['User-Agent'], "Referer": referer}
 
-        while params["page"] <= 10:
-            data = await self.request(url=url, type="json", params=params, headers=headers)
-            for card in data["data"]:
-                card["category_id"] = category_id
-                await self.parse_product(card=card)
-                await asyncio.sleep(0.2)
-
-            params["page"] += 1
-            await asyncio.sleep(1)
-        return
+        data = await self.request(url=url, type="json", params=params, headers=headers)
+        for card in data["data"]:
+            card["category_id"] = category_id
+
+        rows = await self.resolve_product_ids(src_ids=[str(card["id"]) for card in data["data"]])
+        stored = {str(row[0]): row for row in rows}
+
+        await asyncio.gather(*(self.parse_card(card=card, stored=stored.get(str(card["id"]))) for card in data["data"]))
+        await self._writer.complete(self._frontier.page_key(code=code, page=page))
+
+    async def parse_card(self, card: dict, stored=None):
+        """
+        A product listed in several categories is fetched once per run, its other
+        listings wait for that fetch and only record the category membership.
+        """
+        src_id = str(card["id"])
+        seen = self._seen.get(src_id, False)
+        if seen is False:
+            future = self._seen[src_id] = asyncio.get_running_loop().create_future()
+            product_id = None
+            try:
+                product_id = await self.fetch_card(card=card, stored=stored)
+            finally:
+                future.set_result(product_id)
+                # only the id is kept for the rest of the run, waiters already hold the future
+                self._seen[src_id] = product_id
+        else:
+            self._stats["product_fetches_avoided"] += 1
+            product_id = await seen if isinstance(seen, asyncio.Future) else seen
+
+        if product_id:
+            await self._writer.put(ProductCategory(product_id=product_id, category_id=card["category_id"]))
+
+    async def fetch_card(self, card: dict, stored=None) -> str | None:
+        """
+        In incremental mode a product whose listing fingerprint did not change only gets
+        its offers refreshed, otherwise the product page is (conditionally) refetched.
+        """
+        card["fingerprint"] = self.make_fingerprint(card)
+        if self._incremental and stored:
+            card["stored"] = {"id": stored[2], "fingerprint": stored[3], "etag": stored[4], "last_modified": stored[5]}
+            if stored[3] == card["fingerprint"]:
+                await self.refresh_product_suppliers(card=card, product_id=stored[2])
+                return stored[2]
+
+        return await self.parse_product(card=card)
+
+    def make_fingerprint(self, card: dict) -> str:
+        fields = self._config.get("incremental", {}).get("fingerprint_fields", ["title", "rating", "reviewsQuantity", "brand"])
+        payload = json.dumps([card.get(field) for field in fields], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    async def refresh_product_suppliers(self, card: dict, product_id: str):
+        try:
+            self._stats["products_unchanged"] += 1
+            card["product_id"] = product_id
+            # a 304 answer leaves the product row as is, the new listing fingerprint is stored on its own
+            if card["fingerprint"] != (card.get("stored") or {}).get("fingerprint"):
+                await self._writer.put(ProductFingerprint(id=product_id, fingerprint=card["fingerprint"]))
+            for supplier in await self.parse_product_suppliers(card):
+                await self._writer.put(supplier)
+        except Exception as e:
+            self._stats["products_failed"] += 1
+            self._logger.error(f"Failed to refresh offers of product {card['id']}: {e!r}\n{traceback.format_exc()}")
 
-    async def parse_product(self, card: dict):
+    async def parse_product(self, card: dict) -> str | None:
         try:
-            content = await self.request(url=card["shopLink"])
-            page = BeautifulSoup(content, "lxml")
-            data = self.get_product_json(page=page)
+            headers = {"User-Agent": self.HEADERS["User-Agent"]}
+            stored = card.get("stored") or {}
+            if stored.get("etag"):
+                headers["If-None-Match"] = stored["etag"]
+            if stored.get("last_modified"):
+                headers["If-Modified-Since"] = stored["last_modified"]
+
+            status, content, etag, last_modified = await self.request(url=card["shopLink"], type="page", headers=headers)
+            if status == http.HTTPStatus.NOT_MODIFIED:
+                await self.refresh_product_suppliers(card=card, product_id=stored["id"])
+                return stored["id"]
+
+            self._stats["products_fetched"] += 1
+            data = await self.run_parser(parse_product_page, content)
             if not data:
+                self._stats["products_failed"] += 1
+                self._logger.warning(f"No product data found on page of product {card['id']}")
                 return
 
-            image = await self.save_photo(data["galleryImages"][0]["medium"])
-
-            id = await self._db.get_product_id(src_id=data["card"]["id"], name=data["card"]["title"])
-            id = id if id else str(uuid.uuid4())
-
-            description = data["description"].replace(" ", "") if data["description"] else None
-
-            try:
-                characteristics = str(data["specifications"])
-                characteristics = json.dumps(chompjs.parse_js_object(characteristics)) if characteristics else None
-            except Exception as e:
-                characteristics = None
+            id = self.get_product_id(src_id=data["src_id"], name=data["name"])
+            image = self._images.get(url=data["image"], product_id=id)
 
             product = Product(
                 id=id,
-                src_id=data["card"]["id"],
+                src_id=data["src_id"],
                 category_id=card["category_id"],
-                name=data["card"]["title"],
+                name=data["name"],
                 image=image,
-                rating=data["card"]["rating"],
-                description=description,
-                characteristics=characteristics,
+                rating=data["rating"] or 0,
+                description=data["description"],
+                characteristics=data["characteristics"],
+                facets=data["facets"],
+                fingerprint=card["fingerprint"],
+                etag=etag,
+                last_modified=last_modified,
+                image_url=data["image"]
             )
 
             card["product_id"] = id
-            await self.parse_product_suppliers(card)
+            suppliers = await self.parse_product_suppliers(card)
 
-            self.PRODUCTS.append(product)
+            # the product goes first, a batch boundary between them must not leave suppliers without it
+            await self._writer.put(product)
+            for supplier in suppliers:
+                await self._writer.put(supplier)
+            return id
         except Exception as e:
-            return
+            self._stats["products_failed"] += 1
+            self._logger.error(f"Failed to parse product {card['id']}: {e!r}\n{traceback.format_exc()}")
+
+    async def resolve_product_ids(self, src_ids: list):
+        """
+        Pages in ids of already stored products of a listing page with one query.
+        Without preload the map is bounded, least recently used entries are evicted.
+        Returned rows also carry stored fingerprint and validators for incremental mode.
+        """
+        preload = self._config.get("product_ids", {}).get("preload", False)
+        if preload and not self._incremental:
+            return []
+
+        rows = await self._db.get_product_ids(src_ids=src_ids)
+        if preload:
+            return rows
+
+        for row in rows:
+            self._product_ids[(str(row[0]), row[1])] = row[2]
+            self._product_ids.move_to_end((str(row[0]), row[1]))
+
+        max_size = self._config.get("product_ids", {}).get("max_size", 100000)
+        while len(self._product_ids) > max_size:
+            self._product_ids.popitem(last=False)
+
+        return rows
+
+    def get_product_id(self, src_id: str, name: str) -> str:
+        key = (str(src_id), name)
+        id = self._product_ids.get(key)
+        if not id:
+            id = str(uuid.uuid4())
+            self._product_ids[key] = id
+        return id
+
+    def get_cities(self) -> list:
+        return self._config.get("offers", {}).get("cities") or [{"city_id": "750000000", "zone_id": "Magnum_ZONE1"}]
+
+    async def parse_product_suppliers(self, card: dict) -> list:
+        """
+        Fetches offers of every configured city concurrently. A product is dropped only
+        when no city could be fetched, failed cities keep their stored offers.
+        """
+        results = await asyncio.gather(
+            *(self.parse_city_suppliers(card=card, city=city) for city in self.get_cities()),
+            return_exceptions=True
+        )
 
-    async def parse_product_suppliers(self, card: dict):
-        try:
-            url = f"https://kaspi.kz/yml/offer-view/offers/{card['id']}"
-            headers = {"Referer": card["shopLink"], "User-Agent": self.HEADERS["User-Agent"]}
+        suppliers = list()
+        errors = list()
+        for city, result in zip(self.get_cities(), results):
+            if isinstance(result, BaseException):
+                errors.append(result)
+                self._logger.warning(f"Failed to fetch offers of {card['id']} in city {city['city_id']}: {result!r}")
+            else:
+                suppliers.extend(result)
+
+        if errors and len(errors) == len(results):
+            raise errors[0]
+        return suppliers
+
+    async def parse_city_suppliers(self, card: dict, city: dict) -> list:
+        offers_config = self._config.get("offers", {})
+        limit = offers_config.get("page_size", 50)
+        url = f"https://kaspi.kz/yml/offer-view/offers/{card['id']}"
+        headers = {"Referer": card["shopLink"], "User-Agent": self.HEADERS["User-Agent"]}
+
+        suppliers = list()
+        for page in range(offers_config.get("max_pages", 20)):
             payload = {
-                "cityId": "750000000",
+                "cityId": city["city_id"],
                 "id": card["id"],
                 "merchantUID": "",
-                "limit": 5,
-                "page": 0,
+                "limit": limit,
+                "page": page,
                 "sort": True,
                 "product": {
                     "brand": card["brand"],
@@ -171,121 +490,111 @@ class KaspiParser:
                     "baseProductCodes": card["baseProductCodes"] if card.get("baseProductCodes") else [],
                     "groups": None
                 },
-                "zoneId": "Magnum_ZONE1",
+                "zoneId": city["zone_id"],
                 "installationId": "-1"
             }
 
             data = await self.request(method="post", url=url, type="json", headers=headers, json=payload)
-            for offer in data["offers"]:
-                supplier = Supplier(
+            suppliers.extend(
+                Supplier(
                     id=None,
                     product_id=card["product_id"],
+                    city_id=city["city_id"],
                     name=offer["merchantName"],
                     price=offer["price"],
                     rating=offer["merchantRating"]
                 )
-                self.SUPPLIERS.append(supplier)
-        except Exception as e:
-            raise e
+                for offer in data["offers"]
+            )
+            # the api may cap a page below the requested limit, so a short page is not the last one
+            total = data.get("total", data.get("offersCount"))
+            if not data["offers"] or (total is not None and len(suppliers) >= total):
+                break
 
-    async def request(self, url: str, method: str = "get", type: str = "read", **kwargs, ):
-        attempts = 3
-        try:
-            while True:
-                if "headers" not in kwargs.keys():
-                    kwargs["headers"] = self.HEADERS.copy()
+        return suppliers
 
-                async with self.SESSION.request(method=method, url=url, **kwargs) as response:
-                    call = getattr(response, type, None)
-                    content = await call()
+    async def request(self, url: str, method: str = "get", type: str = "read", **kwargs, ):
+        """
+        Retries connection errors, timeouts and 429/5xx answers with exponential backoff and
+        full jitter, Retry-After takes precedence over the backoff. Every outcome feeds the
+        endpoint circuit breaker and the adaptive host rate.
+        """
+        retry = self._config.get("crawler", {}).get("retry", {})
+        attempts = retry.get("attempts", 5)
+        if "headers" not in kwargs.keys():
+            kwargs["headers"] = self.HEADERS.copy()
+
+        error = None
+        for attempt in range(1, attempts + 1):
+            retry_after = None
+            try:
+                self._breaker.check(url)
+                async with self._throttle.slot(url), self.SESSION.request(method=method, url=url, **kwargs) as response:
+                    if response.status in self.RETRY_STATUSES:
+                        retry_after = self.get_retry_after(response.headers.get("Retry-After"))
+                        response.raise_for_status()
+
+                    if type == "page":
+                        content = (
+                            response.status,
+                            await response.read(),
+                            response.headers.get("ETag"),
+                            response.headers.get("Last-Modified")
+                        )
+                    else:
+                        call = getattr(response, type, None)
+                        content = await call()
+
+                self._breaker.record(url, success=True)
+                self._throttle.record(url, success=True)
                 return content
-        except Exception as e:
-            attempts -= 1
-            if attempts == 0:
-                self._logger.error(f"{e}\n{traceback.format_exc()}")
-                raise e
-
-            await asyncio.sleep(1)
-            self._logger.error(e)
+            except CircuitOpenError as e:
+                error, delay = e, e.retry_in
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._breaker.record(url, success=False)
+                self._throttle.record(url, success=False, retry_after=retry_after)
+                error, delay = e, retry_after or self.get_backoff(attempt=attempt)
+
+            if attempt == attempts:
+                break
+
+            self._stats["requests_retried"] += 1
+            delay = min(delay, retry.get("max_delay", 60))
+            self._logger.warning(f"Request {url} failed: {error!r}, retry {attempt}/{attempts - 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        self._stats["requests_failed"] += 1
+        self._logger.error(f"Request {url} failed after {attempts} attempts: {error!r}")
+        raise error
+
+    def get_backoff(self, attempt: int) -> float:
+        retry = self._config.get("crawler", {}).get("retry", {})
+        delay = min(retry.get("max_delay", 60), retry.get("base_delay", 0.5) * 2 ** (attempt - 1))
+        return random.uniform(0, delay)
 
     @staticmethod
-    def get_catalog_json(page: BeautifulSoup):
-        for script in page.find_all("script"):
-            text = script.get_text()
-            if "BACKEND.components.catalog" not in text:
-                continue
-
-            return chompjs.parse_js_object(text)
-        return None
-
-    @staticmethod
-    def get_product_json(page: BeautifulSoup):
-        for script in page.find_all("script"):
-            text = script.get_text()
-
-            if "BACKEND.components.item =" not in text:
-                continue
+    def get_retry_after(value: str | None) -> float | None:
+        if not value:
+            return None
 
-            return chompjs.parse_js_object(text)
-        return None
+        if value.strip().isdigit():
+            return float(value)
 
-    async def save_photo(self, url: str) -> str | None:
-        attempts = 3
         try:
-            while True:
-                async with self.SESSION.get(url=url) as response:
-                    if response.status != 200:
-                        raise Exception(f"Incorrect response status {response.status}")
-
-                    file_bytes = await response.read()
-                    filename = url.split("/")[-1]
-                    filename = filename[:filename.find("?")]
-
-                    save_directory = str(os.path.join(self._config["base_dir"], self._config["files"]))
-                    os.makedirs(save_directory, exist_ok=True)
-                    file_path = os.path.join(save_directory, filename)
-
-                    db_path = str(os.path.join(self._config["files"], filename))
-                    if os.path.exists(file_path):
-                        return db_path
-
-                    async with aiofiles.open(file_path, 'wb') as file:
-                        await file.write(file_bytes)
-
-                    return db_path
-
-        except Exception as e:
-            attempts -= 1
-            if attempts == 0:
-                self._logger.error(e, traceback.format_exc())
-                return None
-            self._logger.error(e)
-
-    async def upload(self):
-        await self._db.insert(
-            table=Category.TABLE,
-            columns=Category.COLUMNS,
-            data=[[c.__dict__.get(col) for col in Category.COLUMNS] for c in self.CATEGORIES],
-            on_conflict=Category.ON_CONFLICT
-        )
-
-        await self._db.insert(
-            table=Product.TABLE,
-            columns=Product.COLUMNS,
-            data=[[c.__dict__.get(col) for col in Product.COLUMNS] for c in self.PRODUCTS],
-            on_conflict=Product.ON_CONFLICT
-        )
-
-        supplier_columns = Supplier.COLUMNS.copy()
-        supplier_columns.remove("id")
-
-        await self._db.insert(
-            table=Supplier.TABLE,
-            columns=supplier_columns,
-            data=[[c.__dict__.get(col) for col in supplier_columns] for c in self.SUPPLIERS],
-            on_conflict=Supplier.ON_CONFLICT
-        )
-
-        self.CATEGORIES.clear()
-        self.PRODUCTS.clear()
-        self.SUPPLIERS.clear()
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            # -0000 dates are parsed as naive, the header is always in utc
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    async def run_parser(self, func, content: bytes):
+        """
+        Runs CPU bound page parsing in the process pool when one is configured,
+        so the event loop keeps serving in-flight requests.
+        """
+        if self._executor is None:
+            return func(content)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, content)